@@ -1,10 +1,39 @@
 import os
-from flask import Flask, render_template_string, request, redirect, url_for, send_file
+import click
+import codecs
+import cProfile
+import csv
+import hashlib
+import hmac
+import json
+import pstats
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import zipfile
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter
+from flask import (
+    Flask, render_template, request, redirect, url_for, send_file, send_from_directory, abort, jsonify, g,
+    has_request_context, stream_with_context, before_render_template, template_rendered,
+)
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, date
-import pandas as pd
+from sqlalchemy import and_, bindparam, case, event, func, inspect, literal, or_, select, text, true, union_all, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import column as sql_column, table as sql_table
+from datetime import datetime, date, timedelta
+from jinja2 import ChoiceLoader, DictLoader, FileSystemBytecodeCache
+from werkzeug.security import safe_join
 import io
 import logging
+import tempfile
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,6 +47,9 @@ if not db_url:
     # Local fallback (sqlite file in repo folder)
     db_url = "sqlite:///vehicles.db"
     logger.info("Using local SQLite database.")
+elif db_url.startswith("sqlite"):
+    # Explicit SQLite file (benchmarks, scratch copies); no Postgres tweaks
+    logger.info("Using SQLite database from DATABASE_URL.")
 else:
     # Normalize common Postgres URL variants to SQLAlchemy form
     if db_url.startswith("postgres://"):
@@ -32,18 +64,105 @@ else:
 
     logger.info("Using cloud Postgres database (DATABASE_URL provided).")
 
+# --- CONNECTION POOL ---
+# Neon / Railway drop idle SSL connections, so pooled connections are
+# pre-pinged, recycled before the provider's idle cutoff and kept alive with
+# TCP keepalives. Sizes are per worker process: keep
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the server/pooler limit.
+#
+# Behind a transaction-mode pooler (PgBouncer, Neon's "-pooler" host) set
+# DB_POOLER=transaction: startup `options` are rejected there and session
+# SETs do not stick, so the statement timeout is applied per transaction.
+DB_POOLER = os.getenv("DB_POOLER", "").lower()
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+
+def postgres_engine_options():
+    connect_args = {
+        "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "10")),
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 5,
+        "application_name": "vehicle-website",
+    }
+    if DB_POOLER != "transaction" and DB_STATEMENT_TIMEOUT_MS:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "5")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "10")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "280")),
+        "pool_pre_ping": True,
+        "pool_use_lifo": True,
+        "connect_args": connect_args,
+    }
+
+
+@event.listens_for(Engine, "begin")
+def _set_local_statement_timeout(conn):
+    if DB_POOLER == "transaction" and DB_STATEMENT_TIMEOUT_MS and conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
+
 app.config['SQLALCHEMY_DATABASE_URI'] = db_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if db_url.startswith("postgresql"):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = postgres_engine_options()
 db = SQLAlchemy(app)
 
 
 # --- MODELS ---
+# Dimension keys are INTEGER: reason uploads add a vehicle_type row per new
+# free-text spelling, which could outrun a SMALLINT sequence
+DimensionKey = db.Integer()
+
+
+class Location(db.Model):
+    """
+    One row per location. Facts carry location_id and aggregate on it; `key`
+    (dimension_key(name)) makes "Karur" and "KARUR " the same location.
+    """
+    __tablename__ = "location"
+    id = db.Column(DimensionKey, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    key = db.Column(db.String(100), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f"<Location {self.id} {self.name}>"
+
+
+class VehicleType(db.Model):
+    """
+    One row per vehicle type, matched on `key` like Location. A type merged
+    into another (`flask merge-vehicle-type`) keeps its row so its spelling
+    still resolves, through merged_into_id, to the surviving type.
+    """
+    __tablename__ = "vehicle_type"
+    id = db.Column(DimensionKey, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    key = db.Column(db.String(100), nullable=False, unique=True)
+    merged_into_id = db.Column(DimensionKey, db.ForeignKey("vehicle_type.id"))
+
+    def __repr__(self):
+        return f"<VehicleType {self.id} {self.name}>"
+
+
 class Vehicle(db.Model):
     __tablename__ = "vehicle"
     id = db.Column(db.Integer, primary_key=True)
     vehicle_type = db.Column(db.String(100), nullable=False)
     location = db.Column(db.String(100), nullable=False)
     total_count = db.Column(db.Integer, nullable=False)
+    location_id = db.Column(DimensionKey, db.ForeignKey("location.id"))
+    vehicle_type_id = db.Column(DimensionKey, db.ForeignKey("vehicle_type.id"))
+
+    # Every page filters and sorts the catalog by location, then type
+    __table_args__ = (
+        db.Index("ix_vehicle_location_type", "location", "vehicle_type"),
+        db.Index("ix_vehicle_location_id_type_id", "location_id", "vehicle_type_id"),
+    )
 
     def __repr__(self):
         return f"<Vehicle {self.vehicle_type} - {self.location}>"
@@ -61,7 +180,19 @@ class DailyStatus(db.Model):
     idle_from = db.Column(db.Date)
     reason = db.Column(db.String(255))
 
-    vehicle = db.relationship('Vehicle', backref='statuses')
+    # Never lazy-load across this relationship: a per-row load is an N+1 of
+    # round trips. Join in the query or use selectinload() explicitly.
+    vehicle = db.relationship(
+        'Vehicle',
+        backref=db.backref('statuses', lazy='raise_on_sql'),
+        lazy='raise_on_sql'
+    )
+
+    # One status row per vehicle per day; also the conflict target for upserts.
+    # Its leading `date` column serves the per-day filters, so no separate index.
+    __table_args__ = (
+        db.Index("uq_daily_status_date_vehicle", "date", "vehicle_id", unique=True),
+    )
 
     def __repr__(self):
         return f"<DailyStatus {self.date} - {self.vehicle_id}>"
@@ -79,11 +210,60 @@ class ReasonEntry(db.Model):
     owner = db.Column(db.String(100))
     remarks = db.Column(db.String(255))
     idle_date = db.Column(db.String(50))
+    # idle_date parsed to a real date (NULL when it is not a recognised format)
+    idle_since = db.Column(db.Date)
+    # vehicle_no upper-cased with spaces/punctuation removed, for search. Byte
+    # ("C") collation on Postgres so prefix ranges can use the B-tree.
+    vehicle_no_norm = db.Column(
+        db.String(100).with_variant(postgresql.VARCHAR(100, collation="C"), "postgresql")
+    )
+    # The location / vehicle_type strings resolved to dimension keys. The
+    # strings stay as typed (exports, search); reports group on the keys.
+    location_id = db.Column(DimensionKey, db.ForeignKey("location.id"))
+    vehicle_type_id = db.Column(DimensionKey, db.ForeignKey("vehicle_type.id"))
+
+    # Reasons are always read for a date (and location), ordered by serial_no
+    __table_args__ = (
+        db.Index("ix_reason_entry_date_location_serial", "date", "location", "serial_no"),
+        db.Index("ix_reason_entry_date_location_id_type_id", "date", "location_id", "vehicle_type_id"),
+        db.Index("ix_reason_entry_idle_since", "idle_since"),
+        db.Index("ix_reason_entry_vehicle_no_norm_date", "vehicle_no_norm", "date"),
+    )
 
     def __repr__(self):
         return f"<ReasonEntry {self.date} - {self.location} - {self.serial_no}>"
 
 
+class DailyRollup(db.Model):
+    """Pre-aggregated counts per (date, location, vehicle type) for trend views."""
+    __tablename__ = "daily_rollup"
+    date = db.Column(db.Date, primary_key=True)
+    location_id = db.Column(DimensionKey, db.ForeignKey("location.id"), primary_key=True)
+    vehicle_type_id = db.Column(DimensionKey, db.ForeignKey("vehicle_type.id"), primary_key=True)
+
+    total = db.Column(db.Integer, nullable=False, default=0)
+    running = db.Column(db.Integer, nullable=False, default=0)
+    idle = db.Column(db.Integer, nullable=False, default=0)
+    not_updated = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DailyRollup {self.date} - {self.location_id} - {self.vehicle_type_id}>"
+
+
+class DataVersion(db.Model):
+    """
+    Write counters shared by all workers: "catalog" for vehicle totals and
+    "day:YYYY-MM-DD" for each date's statuses and reasons. Used to build
+    ETags so clients can revalidate without the data being recomputed.
+    """
+    __tablename__ = "data_version"
+    key = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DataVersion {self.key} = {self.version}>"
+
+
 # --- INITIAL DB CREATION AND SAMPLE VEHICLES ---
 def seed_vehicles():
     """Run once to insert your fixed vehicle list if database is empty."""
@@ -147,17 +327,492 @@ def seed_vehicles():
         {"vehicle_type": "MINI EXCAVATORS",   "location": "TUTICORIN", "total_count": 0},
     ]
 
+    location_ids = dimension_ids(Location, [v["location"] for v in fixed_vehicles])
+    type_ids = dimension_ids(VehicleType, [v["vehicle_type"] for v in fixed_vehicles])
     for v in fixed_vehicles:
-        db.session.add(Vehicle(**v))
+        db.session.add(Vehicle(
+            **v,
+            location_id=location_ids[dimension_key(v["location"])],
+            vehicle_type_id=type_ids[dimension_key(v["vehicle_type"])],
+        ))
+    bump_data_versions(CATALOG_VERSION_KEY)
     db.session.commit()
     logger.info("✅ Vehicles inserted. Edit seed_vehicles() to match your real counts.")
 
 
-with app.app_context():
+def ensure_status_unique_index():
+    """
+    Add the (date, vehicle_id) unique index to databases created before it
+    existed. Duplicate status rows are collapsed first, keeping the newest.
+    """
+    indexes = inspect(db.engine).get_indexes("daily_status")
+    if any(ix["name"] == "uq_daily_status_date_vehicle" for ix in indexes):
+        return
+
+    removed = db.session.execute(text(
+        "DELETE FROM daily_status WHERE id NOT IN ("
+        "SELECT MAX(id) FROM daily_status GROUP BY date, vehicle_id)"
+    )).rowcount
+    if removed:
+        logger.info("Removed %d duplicate daily_status rows.", removed)
+
+    db.session.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_daily_status_date_vehicle "
+        "ON daily_status (date, vehicle_id)"
+    ))
+    db.session.commit()
+    logger.info("Created unique index on daily_status (date, vehicle_id).")
+
+
+def ensure_reason_idle_since_column():
+    """
+    Add reason_entry.idle_since to databases created before it existed. The
+    column is nullable, so this is a metadata-only change; existing rows are
+    filled by `flask backfill-idle-since`.
+    """
+    columns = inspect(db.engine).get_columns("reason_entry")
+    if any(col["name"] == "idle_since" for col in columns):
+        return
+
+    db.session.execute(text("ALTER TABLE reason_entry ADD COLUMN idle_since DATE"))
+    db.session.commit()
+    logger.info("Added reason_entry.idle_since; run `flask backfill-idle-since` to fill it.")
+    create_missing_indexes()
+
+
+def ensure_reason_search_schema():
+    """
+    Add vehicle_no_norm and the owner/remarks text index to databases that
+    predate search. Postgres gets a GIN index over a 'simple' tsvector;
+    SQLite an external-content FTS5 table kept in sync by triggers. Safe to
+    re-run; fill old rows with `flask backfill-vehicle-numbers`.
+    """
+    is_postgres = db.engine.dialect.name == "postgresql"
+    columns = inspect(db.engine).get_columns("reason_entry")
+    if not any(col["name"] == "vehicle_no_norm" for col in columns):
+        collation = ' COLLATE "C"' if is_postgres else ""
+        db.session.execute(text(f"ALTER TABLE reason_entry ADD COLUMN vehicle_no_norm VARCHAR(100){collation}"))
+        db.session.commit()
+        logger.info("Added reason_entry.vehicle_no_norm; run `flask backfill-vehicle-numbers` to fill it.")
+        create_missing_indexes()
+
+    if is_postgres:
+        # CONCURRENTLY waits out open transactions, including this session's
+        db.session.commit()
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            concurrently = "" if "reason_entry" in partitioned_tables(conn) else "CONCURRENTLY "
+            conn.execute(text(
+                f"CREATE INDEX {concurrently}IF NOT EXISTS ix_reason_entry_text_search "
+                f"ON reason_entry USING gin ({REASON_TSVECTOR_SQL})"
+            ))
+        return
+
+    if not SQLITE_HAS_FTS5:
+        logger.warning("SQLite was built without FTS5; reason text search will scan the table.")
+        return
+
+    has_index = db.session.execute(text(
+        "SELECT count(*) FROM sqlite_master WHERE name = 'reason_search'"
+    )).scalar()
+    triggers = db.session.execute(text(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'reason_search_%'"
+    )).scalar()
+    if has_index and triggers == 3:
+        return
+
+    db.session.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS reason_search USING fts5("
+        "owner, remarks, content='reason_entry', content_rowid='id')"
+    ))
+    db.session.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS reason_search_ai AFTER INSERT ON reason_entry BEGIN "
+        "INSERT INTO reason_search(rowid, owner, remarks) VALUES (new.id, new.owner, new.remarks); END"
+    ))
+    db.session.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS reason_search_ad AFTER DELETE ON reason_entry BEGIN "
+        "INSERT INTO reason_search(reason_search, rowid, owner, remarks) "
+        "VALUES ('delete', old.id, old.owner, old.remarks); END"
+    ))
+    db.session.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS reason_search_au AFTER UPDATE OF owner, remarks ON reason_entry BEGIN "
+        "INSERT INTO reason_search(reason_search, rowid, owner, remarks) "
+        "VALUES ('delete', old.id, old.owner, old.remarks); "
+        "INSERT INTO reason_search(rowid, owner, remarks) VALUES (new.id, new.owner, new.remarks); END"
+    ))
+    # Index whatever the table already holds
+    db.session.execute(text("INSERT INTO reason_search(reason_search) VALUES ('rebuild')"))
+    db.session.commit()
+    logger.info("Built the reason_search FTS5 index.")
+
+
+def ensure_dimension_keys():
+    """
+    Move databases that predate the location / vehicle_type tables onto
+    them: add the location_id / vehicle_type_id columns to vehicle and
+    reason_entry, fill them from the name columns, and rebuild daily_rollup
+    (derived data) on the integer keys, or fill it when it is empty but
+    daily_status is not. Safe to re-run.
+    """
+    key_type = DimensionKey.compile(dialect=db.engine.dialect)
+    added = []
+    for table in ("vehicle", "reason_entry"):
+        columns = {col["name"] for col in inspect(db.engine).get_columns(table)}
+        for column, target in (("location_id", "location"), ("vehicle_type_id", "vehicle_type")):
+            if column not in columns:
+                db.session.execute(text(
+                    f"ALTER TABLE {table} ADD COLUMN {column} {key_type} REFERENCES {target} (id)"
+                ))
+                added.append(f"{table}.{column}")
+
+    if db.engine.dialect.name == "postgresql":
+        widen_dimension_keys()
+
+    rollup_columns = {col["name"] for col in inspect(db.engine).get_columns("daily_rollup")}
+    rebuild_rollup = "location_id" not in rollup_columns
+    # Databases older than the rollup get it from create_all() already in the
+    # new shape, but empty
+    fill_rollup = rebuild_rollup or (
+        db.session.query(DailyRollup.date).first() is None and db.session.query(DailyStatus.id).first() is not None
+    )
+    db.session.commit()
+
+    if added:
+        logger.info("Added %s; filling them from the name columns.", ", ".join(added))
+        create_missing_indexes()
+        filled = backfill_dimension_keys()
+        logger.info("Resolved dimension keys for %d rows.", filled)
+
+    if rebuild_rollup:
+        DailyRollup.__table__.drop(db.engine)
+        DailyRollup.__table__.create(db.engine)
+    if fill_rollup:
+        first, last = db.session.query(func.min(DailyStatus.date), func.max(DailyStatus.date)).one()
+        if first is not None:
+            backfill_daily_rollup(first, last)
+        logger.info("Built daily_rollup on location_id / vehicle_type_id.")
+
+
+def widen_dimension_keys():
+    """
+    Postgres: turn dimension key columns and id sequences created as SMALLINT
+    into INTEGER. Caller commits.
+    """
+    key_columns = {
+        (table.name, column.name)
+        for table in db.metadata.sorted_tables
+        for column in table.columns
+        if isinstance(column.type, db.Integer)
+    }
+
+    def narrow_columns():
+        return {tuple(row) for row in db.session.execute(text(
+            "SELECT table_name, column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND data_type = 'smallint'"
+        ))}
+
+    # Attached partitions follow their parent
+    for table, column in sorted(key_columns & narrow_columns()):
+        db.session.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE integer'))
+        logger.info("Widened %s.%s to INTEGER.", table, column)
+    # Detached (archived) partitions must match the parent again to be re-attached
+    for table, column in sorted(narrow_columns()):
+        parent = re.sub(r"_p\d{4}_\d{2}$", "", table)
+        if parent in PARTITIONED_TABLES and (parent, column) in key_columns:
+            db.session.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE integer'))
+            logger.info("Widened %s.%s to INTEGER.", table, column)
+    for model in (Location, VehicleType):
+        sequence = db.session.execute(
+            text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": model.__tablename__}
+        ).scalar()
+        if sequence:
+            db.session.execute(text(f"ALTER SEQUENCE {sequence} AS integer"))
+
+
+def backfill_dimension_keys():
+    """
+    Fill NULL location_id / vehicle_type_id on vehicle and reason_entry from
+    their name columns, in keyset batches. Returns the number of rows filled.
+    """
+    filled = 0
+    for model in (Vehicle, ReasonEntry):
+        last_id = 0
+        while True:
+            rows = (
+                db.session.query(model.id, model.location, model.vehicle_type)
+                .filter(model.id > last_id, or_(model.location_id.is_(None), model.vehicle_type_id.is_(None)))
+                .order_by(model.id)
+                .limit(INGEST_CHUNK_ROWS)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            location_ids = dimension_ids(Location, {location for _, location, _ in rows})
+            type_ids = dimension_ids(VehicleType, {vehicle_type for _, _, vehicle_type in rows if vehicle_type})
+            db.session.execute(update(model), [
+                {
+                    "id": row_id,
+                    "location_id": location_ids.get(dimension_key(location)),
+                    "vehicle_type_id": type_ids.get(dimension_key(vehicle_type)),
+                }
+                for row_id, location, vehicle_type in rows
+            ])
+            if model is Vehicle:
+                bump_data_versions(CATALOG_VERSION_KEY)
+            db.session.commit()
+            filled += len(rows)
+    return filled
+
+
+@app.cli.command("backfill-dimensions")
+def backfill_dimensions_command():
+    """Resolve location_id / vehicle_type_id for rows that are missing them."""
+    print(f"Resolved dimension keys for {backfill_dimension_keys()} rows.")
+
+
+@app.cli.command("merge-vehicle-type")
+@click.argument("source")
+@click.argument("target")
+def merge_vehicle_type_command(source, target):
+    """
+    Fold vehicle type SOURCE into TARGET, e.g. a misspelling into the right
+    name, or rename SOURCE when no TARGET type exists yet. SOURCE's spelling
+    keeps resolving to the result for future reason uploads.
+    """
+    merged = VehicleType.query.filter_by(key=dimension_key(source), merged_into_id=None).first()
+    if merged is None:
+        raise click.ClickException(f"No vehicle type matches {source!r}")
+    survivor = VehicleType.query.filter_by(key=dimension_key(target)).first()
+
+    if survivor is None or survivor.id == merged.id:
+        # Rename in place; the old spelling becomes an alias row
+        old_name, old_key = merged.name, merged.key
+        merged.name, merged.key = target.strip(), dimension_key(target)
+        db.session.flush()
+        if merged.key != old_key:
+            db.session.add(VehicleType(name=old_name, key=old_key, merged_into_id=merged.id))
+        Vehicle.query.filter_by(vehicle_type_id=merged.id).update(
+            {"vehicle_type": merged.name}, synchronize_session=False
+        )
+        bump_data_versions(CATALOG_VERSION_KEY)
+        db.session.commit()
+        print(f"Renamed {old_name!r} to {merged.name!r}.")
+        return
+
+    if survivor.merged_into_id is not None:
+        survivor = db.session.get(VehicleType, survivor.merged_into_id)
+    clashes = (
+        db.session.query(Vehicle.location)
+        .filter(Vehicle.vehicle_type_id.in_([merged.id, survivor.id]))
+        .group_by(Vehicle.location_id, Vehicle.location)
+        .having(func.count(func.distinct(Vehicle.vehicle_type_id)) > 1)
+        .all()
+    )
+    if clashes:
+        raise click.ClickException(
+            "Both types have vehicles at " + ", ".join(loc for loc, in clashes)
+            + "; move the counts onto one of them first."
+        )
+
+    Vehicle.query.filter_by(vehicle_type_id=merged.id).update(
+        {"vehicle_type_id": survivor.id, "vehicle_type": survivor.name}, synchronize_session=False
+    )
+    ReasonEntry.query.filter_by(vehicle_type_id=merged.id).update(
+        {"vehicle_type_id": survivor.id}, synchronize_session=False
+    )
+    VehicleType.query.filter(
+        or_(VehicleType.id == merged.id, VehicleType.merged_into_id == merged.id)
+    ).update({"merged_into_id": survivor.id}, synchronize_session=False)
+    DailyRollup.query.filter_by(vehicle_type_id=merged.id).delete(synchronize_session=False)
+    bump_data_versions(CATALOG_VERSION_KEY)
+    db.session.commit()
+
+    first, last = db.session.query(func.min(DailyStatus.date), func.max(DailyStatus.date)).one()
+    if first is not None:
+        backfill_daily_rollup(first, last)
+    print(f"Merged {merged.name!r} into {survivor.name!r}.")
+
+
+def backfill_vehicle_numbers():
+    """Fill vehicle_no_norm where it is NULL, in keyset batches. Returns rows filled."""
+    filled = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.session.query(ReasonEntry.id, ReasonEntry.vehicle_no)
+            .filter(ReasonEntry.id > last_id, ReasonEntry.vehicle_no_norm.is_(None))
+            .order_by(ReasonEntry.id)
+            .limit(INGEST_CHUNK_ROWS)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        db.session.execute(update(ReasonEntry), [
+            {"id": row_id, "vehicle_no_norm": normalize_vehicle_no(vehicle_no)}
+            for row_id, vehicle_no in rows
+        ])
+        db.session.commit()
+        filled += len(rows)
+    return filled
+
+
+@app.cli.command("backfill-vehicle-numbers")
+def backfill_vehicle_numbers_command():
+    """Fill vehicle_no_norm for rows saved before search existed."""
+    print(f"Normalized {backfill_vehicle_numbers()} vehicle numbers.")
+
+
+def backfill_idle_since():
+    """
+    Parse idle_date into idle_since where it is NULL, in keyset batches.
+    Returns (rows filled, rows scanned).
+    """
+    import pandas as pd
+
+    scanned = filled = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.session.query(ReasonEntry.id, ReasonEntry.idle_date)
+            .filter(ReasonEntry.id > last_id, ReasonEntry.idle_since.is_(None), ReasonEntry.idle_date != "")
+            .order_by(ReasonEntry.id)
+            .limit(INGEST_CHUNK_ROWS)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        scanned += len(rows)
+
+        ids, raw = zip(*rows)
+        parsed = parse_idle_dates(pd.Series(raw, dtype=object).fillna("").str.strip())
+        updates = [
+            {"id": row_id, "idle_since": idle_since}
+            for row_id, idle_since in zip(ids, parsed)
+            if idle_since is not None
+        ]
+        if updates:
+            db.session.execute(update(ReasonEntry), updates)
+        db.session.commit()
+        filled += len(updates)
+    return filled, scanned
+
+
+@app.cli.command("backfill-idle-since")
+def backfill_idle_since_command():
+    """Parse idle_date into idle_since for rows saved before the column existed."""
+    filled, scanned = backfill_idle_since()
+    print(f"Parsed {filled} of {scanned} idle dates.")
+
+
+def create_missing_indexes():
+    """
+    Create any model index missing from an existing database.
+
+    db.create_all() only builds indexes together with new tables, so older
+    databases need this. Safe to re-run: indexes are created with IF NOT
+    EXISTS, and on Postgres with CONCURRENTLY so writes are not blocked and
+    the table is not rewritten. Partitioned tables cannot build concurrently;
+    their indexes are built on every partition under a lock instead.
+    Returns the names of indexes created.
+    """
+    is_postgres = db.engine.dialect.name == "postgresql"
+    created = []
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        partitioned = partitioned_tables(conn)
+        existing = set()
+        table_columns = {}
+        for table_name in db.metadata.tables:
+            existing.update(ix["name"] for ix in inspect(conn).get_indexes(table_name))
+            table_columns[table_name] = {col["name"] for col in inspect(conn).get_columns(table_name)}
+
+        if is_postgres:
+            # A failed concurrent build leaves an INVALID index behind; drop and rebuild it
+            invalid = conn.execute(text(
+                "SELECT c.relname FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE NOT i.indisvalid"
+            )).scalars().all()
+            for name in invalid:
+                logger.info("Dropping invalid index %s", name)
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+                existing.discard(name)
+
+        for table in db.metadata.sorted_tables:
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                if index.name in existing:
+                    continue
+                # Columns still to be added by a later ensure_* step (SQLite
+                # would read an unknown quoted name as a string literal)
+                if not {col.name for col in index.columns} <= table_columns[table.name]:
+                    continue
+                columns = ", ".join(f'"{col.name}"' for col in index.columns)
+                concurrently = is_postgres and table.name not in partitioned
+                conn.execute(text(
+                    f"CREATE {'UNIQUE ' if index.unique else ''}INDEX "
+                    f"{'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+                    f'"{index.name}" ON "{table.name}" ({columns})'
+                ))
+                logger.info("Created index %s on %s", index.name, table.name)
+                created.append(index.name)
+
+    return created
+
+
+@app.cli.command("create-indexes")
+def create_indexes_command():
+    """Create missing indexes on an existing database (idempotent)."""
+    created = create_missing_indexes()
+    print(f"Created {len(created)} index(es)." if created else "All indexes already exist.")
+
+
+@app.cli.command("backfill-rollup")
+@click.option("--from", "from_str", help="First date (YYYY-MM-DD); default: earliest status row.")
+@click.option("--to", "to_str", help="Last date (YYYY-MM-DD); default: latest status row.")
+def backfill_rollup_command(from_str, to_str):
+    """Rebuild daily_rollup from historical daily_status rows."""
+    first, last = db.session.query(func.min(DailyStatus.date), func.max(DailyStatus.date)).one()
+    start_date = datetime.strptime(from_str, "%Y-%m-%d").date() if from_str else first
+    end_date = datetime.strptime(to_str, "%Y-%m-%d").date() if to_str else last
+    if start_date is None or end_date is None:
+        print("No daily_status rows to backfill.")
+        return
+
+    backfill_daily_rollup(start_date, end_date)
+    print(f"Rollup backfilled for {start_date}..{end_date}.")
+
+
+def backfill_daily_rollup(start_date, end_date):
+    # One transaction per calendar month keeps each statement bounded
+    for chunk_start, chunk_end in month_ranges(start_date, end_date):
+        refresh_daily_rollup(chunk_start, chunk_end, only_status_dates=True)
+        db.session.commit()
+        logger.info("Rollup rebuilt for %s..%s", chunk_start, chunk_end)
+
+
+def init_db():
+    """Create tables, upgrade older schemas and seed the vehicle list."""
     db.create_all()
+    ensure_status_unique_index()
+    ensure_reason_idle_since_column()
+    ensure_reason_search_schema()
+    ensure_dimension_keys()
+    ensure_partitions()
     seed_vehicles()
 
 
+# Schema work runs once per deploy (Procfile release phase), not on every
+# worker boot, so a cold start does not pay for Postgres round trips.
+@app.cli.command("init-db")
+def init_db_command():
+    """Create missing tables and seed vehicles (safe to re-run)."""
+    init_db()
+    print("Database initialised.")
+
+
 # --- HTML TEMPLATES ---
 
 MAIN_TEMPLATE = """
@@ -235,6 +890,38 @@ MAIN_TEMPLATE = """
         </div>
     </form>
 
+    <!-- Excel export for a date range -->
+    <form method="get" action="{{ url_for('download_report') }}">
+        <div class="top-bar">
+            <div>
+                <label>Export From: </label>
+                <input type="date" name="from" value="{{ selected_date }}">
+            </div>
+
+            <div>
+                <label>To: </label>
+                <input type="date" name="to" value="{{ selected_date }}">
+            </div>
+
+            <input type="hidden" name="location" value="{{ selected_location }}">
+
+            <div>
+                <button type="submit" class="btn btn-primary">Download Excel (Range)</button>
+            </div>
+
+            <div>
+                <button type="submit" class="btn btn-secondary"
+                        formaction="{{ url_for('export_data', dataset='status', fmt='csv') }}">Status CSV</button>
+                <button type="submit" class="btn btn-secondary"
+                        formaction="{{ url_for('export_data', dataset='reasons', fmt='csv') }}">Reasons CSV</button>
+                <button type="submit" class="btn btn-secondary"
+                        formaction="{{ url_for('export_data', dataset='status', fmt='parquet') }}">Status Parquet</button>
+                <button type="submit" class="btn btn-secondary"
+                        formaction="{{ url_for('export_data', dataset='reasons', fmt='parquet') }}">Reasons Parquet</button>
+            </div>
+        </div>
+    </form>
+
     <form method="post" action="{{ url_for('save') }}">
         <input type="hidden" name="date" value="{{ selected_date }}">
         <input type="hidden" name="location" value="{{ selected_location }}">
@@ -290,10 +977,23 @@ MAIN_TEMPLATE = """
             <textarea name="reasons_raw" rows="10" placeholder="Example:
 1[TAB]TN01AB1234[TAB]JCB[TAB]ABC CONTRACTOR[TAB]Breakdown clutch[TAB]08-12-2025
 2[TAB]TN01AB5678[TAB]TRACTOR[TAB]XYZ OWNER[TAB]Tyre puncture[TAB]09-12-2025"></textarea>
+            <br>
+            <label><input type="checkbox" name="mode" value="replace"> Replace all saved reasons (otherwise only changed rows are written)</label>
             <br><br>
             <button type="submit" class="btn btn-secondary">Save Reasons for {{ selected_location }}</button>
         </form>
 
+        <p>
+            Or upload an .xlsx / .csv file with the same columns (a header row is fine):
+        </p>
+        <form method="post" action="{{ url_for('upload_reasons') }}" enctype="multipart/form-data">
+            <input type="hidden" name="date" value="{{ selected_date }}">
+            <input type="hidden" name="location" value="{{ selected_location }}">
+            <input type="file" name="reasons_file" accept=".xlsx,.csv,.tsv,.txt">
+            <label><input type="checkbox" name="mode" value="replace"> Replace all</label>
+            <button type="submit" class="btn btn-secondary">Upload Reasons for {{ selected_location }}</button>
+        </form>
+
         {% if reasons %}
             <h3>Saved Reasons ({{ selected_location }})</h3>
             <table>
@@ -420,7 +1120,7 @@ DASHBOARD_TEMPLATE = """
 <body>
     <h1>Vehicle Dashboard</h1>
 
-    <form method="get" action="{{ url_for('dashboard') }}">
+    <form method="get" action="{{ url_for('dashboard') }}" id="dashboardFilters">
         <div class="top-bar">
             <div>
                 <label>Select Date: </label>
@@ -442,44 +1142,51 @@ DASHBOARD_TEMPLATE = """
             </div>
 
             <div>
-                <a href="{{ url_for('index', date=selected_date, location=selected_location) }}" class="btn btn-back">Back to Entry Page</a>
+                <a href="{{ url_for('index', date=selected_date, location=selected_location) }}" class="btn btn-back" id="entryLink">Back to Entry Page</a>
+            </div>
+
+            <div>
+                <a href="{{ url_for('trends', to=selected_date, location=selected_location) }}" class="btn btn-primary" id="trendsLink">Trends</a>
+            </div>
+
+            <div>
+                <a href="{{ url_for('idle_aging', date=selected_date, location=selected_location) }}" class="btn btn-primary" id="agingLink">Idle Aging</a>
+            </div>
+
+            <div>
+                <a href="{{ url_for('search') }}" class="btn btn-primary">Search Vehicles</a>
             </div>
         </div>
     </form>
 
     <div class="summary-box">
-        <b>Date:</b> {{ selected_date }}
-        {% if selected_location == 'all' %}
-            &nbsp;&nbsp;|&nbsp;&nbsp; <b>Location:</b> All
-        {% else %}
-            &nbsp;&nbsp;|&nbsp;&nbsp; <b>Location:</b> {{ selected_location }}
-        {% endif %}
+        <b>Date:</b> <span id="summaryDate">{{ selected_date }}</span>
+        &nbsp;&nbsp;|&nbsp;&nbsp; <b>Location:</b>
+        <span id="summaryLocation">{% if selected_location == 'all' %}All{% else %}{{ selected_location }}{% endif %}</span>
     </div>
 
-    {% if overall_totals %}
-    <div class="summary-cards">
+    <div class="summary-cards" id="summaryCards" style="display: none;">
         <div class="card">
             <div class="card-title">Total Vehicles (Fixed)</div>
-            <div class="card-value">{{ overall_totals.total_fixed }}</div>
+            <div class="card-value" id="cardTotalFixed"></div>
             <div class="card-sub">Across selected view</div>
         </div>
         <div class="card">
             <div class="card-title">Running</div>
-            <div class="card-value">{{ overall_totals.running }}</div>
+            <div class="card-value" id="cardRunning"></div>
             <div class="card-sub">Vehicles in operation</div>
         </div>
         <div class="card">
             <div class="card-title">Idle (Not Running)</div>
-            <div class="card-value">{{ overall_totals.idle }}</div>
+            <div class="card-value" id="cardIdle"></div>
             <div class="card-sub">Marked as idle</div>
         </div>
         <div class="card">
             <div class="card-title">Not Updated</div>
-            <div class="card-value">{{ overall_totals.not_updated }}</div>
+            <div class="card-value" id="cardNotUpdated"></div>
             <div class="card-sub">No entry filled</div>
         </div>
     </div>
-    {% endif %}
 
     <div class="charts-row">
         <div class="chart-box">
@@ -488,7 +1195,7 @@ DASHBOARD_TEMPLATE = """
         </div>
         <div class="chart-box">
             <div class="chart-title">
-                By Vehicle Type{% if selected_location != 'all' %} - {{ selected_location }}{% endif %}
+                By Vehicle Type<span class="location-suffix"></span>
             </div>
             <canvas id="typeChart"></canvas>
         </div>
@@ -500,103 +1207,340 @@ DASHBOARD_TEMPLATE = """
 
     <h2>Summary by Location</h2>
     <table>
-        <tr>
-            <th>S No</th>
-            <th>Location</th>
-            <th>Total Vehicles (Fixed)</th>
-            <th>Running</th>
-            <th>Idle (Not Running)</th>
-            <th>Not Updated</th>
-        </tr>
-        {% for row in location_summary %}
+        <thead>
             <tr>
-                <td>{{ loop.index }}</td>
-                <td>{{ row.location }}</td>
-                <td>{{ row.total_fixed }}</td>
-                <td>{{ row.running }}</td>
-                <td>{{ row.idle }}</td>
-                <td>{{ row.not_updated }}</td>
+                <th>S No</th>
+                <th>Location</th>
+                <th>Total Vehicles (Fixed)</th>
+                <th>Running</th>
+                <th>Idle (Not Running)</th>
+                <th>Not Updated</th>
             </tr>
-        {% endfor %}
-        {% if location_summary_totals %}
+        </thead>
+        <tbody id="locationSummary"></tbody>
+    </table>
+
+    <h2>Summary by Vehicle Type<span class="location-suffix"></span></h2>
+    <table>
+        <thead>
             <tr>
-                <th colspan="2">TOTAL</th>
-                <th>{{ location_summary_totals.total_fixed }}</th>
-                <th>{{ location_summary_totals.running }}</th>
-                <th>{{ location_summary_totals.idle }}</th>
-                <th>{{ location_summary_totals.not_updated }}</th>
+                <th>S No</th>
+                <th>Vehicle Type</th>
+                <th>Total Count (Fixed)</th>
+                <th>Running</th>
+                <th>Idle (Not Running)</th>
+                <th>Not Updated</th>
             </tr>
-        {% endif %}
+        </thead>
+        <tbody id="typeSummary"></tbody>
     </table>
 
-    <h2>Summary by Vehicle Type{% if selected_location != 'all' %} - {{ selected_location }}{% endif %}</h2>
+    <script>
+        // Data comes from the JSON API. Each refresh revalidates with
+        // If-None-Match (cache: 'no-cache'), so an unchanged day costs a 304.
+        const apiUrl = {{ url_for('api_dashboard') | tojson }};
+        const entryUrl = {{ url_for('index') | tojson }};
+        const trendsUrl = {{ url_for('trends') | tojson }};
+        const agingUrl = {{ url_for('idle_aging') | tojson }};
+        const form = document.getElementById('dashboardFilters');
+        let lastEtag = null;
+        let charts = null;
+
+        const stackedOptions = {
+            responsive: true,
+            plugins: {
+                legend: { position: 'top' },
+                title: { display: false }
+            },
+            scales: {
+                x: { stacked: true },
+                y: { stacked: true, beginAtZero: true }
+            }
+        };
+
+        function statusDatasets(series) {
+            return [
+                {
+                    label: 'Running',
+                    data: series.running,
+                    backgroundColor: 'rgba(40, 167, 69, 0.8)'
+                },
+                {
+                    label: 'Idle',
+                    data: series.idle,
+                    backgroundColor: 'rgba(255, 193, 7, 0.8)'
+                },
+                {
+                    label: 'Not Updated',
+                    data: series.not_updated,
+                    backgroundColor: 'rgba(220, 53, 69, 0.8)'
+                }
+            ];
+        }
+
+        function cell(tag, text, attrs) {
+            const el = document.createElement(tag);
+            el.textContent = text;
+            Object.assign(el, attrs || {});
+            return el;
+        }
+
+        function fillTable(tbodyId, rows, labelKey, totals) {
+            const tbody = document.getElementById(tbodyId);
+            tbody.replaceChildren();
+            rows.forEach((row, i) => {
+                const tr = document.createElement('tr');
+                [i + 1, row[labelKey], row.total_fixed, row.running, row.idle, row.not_updated]
+                    .forEach(v => tr.appendChild(cell('td', v)));
+                tbody.appendChild(tr);
+            });
+            if (totals) {
+                const tr = document.createElement('tr');
+                tr.appendChild(cell('th', 'TOTAL', { colSpan: 2 }));
+                [totals.total_fixed, totals.running, totals.idle, totals.not_updated]
+                    .forEach(v => tr.appendChild(cell('th', v)));
+                tbody.appendChild(tr);
+            }
+        }
+
+        function render(data) {
+            document.getElementById('summaryDate').textContent = data.date;
+            document.getElementById('summaryLocation').textContent = data.location === 'all' ? 'All' : data.location;
+            document.querySelectorAll('.location-suffix').forEach(el => {
+                el.textContent = data.location === 'all' ? '' : ' - ' + data.location;
+            });
+
+            const totals = data.overall_totals;
+            document.getElementById('summaryCards').style.display = totals ? '' : 'none';
+            if (totals) {
+                document.getElementById('cardTotalFixed').textContent = totals.total_fixed;
+                document.getElementById('cardRunning').textContent = totals.running;
+                document.getElementById('cardIdle').textContent = totals.idle;
+                document.getElementById('cardNotUpdated').textContent = totals.not_updated;
+            }
+
+            fillTable('locationSummary', data.location_summary, 'location', data.location_summary_totals);
+            fillTable('typeSummary', data.type_summary, 'vehicle_type', data.type_summary_totals);
+
+            const c = data.charts;
+            const overall = [c.overall.running, c.overall.idle, c.overall.not_updated];
+            if (charts) {
+                charts.location.data.labels = c.location.labels;
+                charts.location.data.datasets = statusDatasets(c.location);
+                charts.type.data.labels = c.type.labels;
+                charts.type.data.datasets = statusDatasets(c.type);
+                charts.overall.data.datasets[0].data = overall;
+                Object.values(charts).forEach(chart => chart.update());
+                return;
+            }
+
+            charts = {
+                location: new Chart(document.getElementById('locationChart').getContext('2d'), {
+                    type: 'bar',
+                    data: { labels: c.location.labels, datasets: statusDatasets(c.location) },
+                    options: stackedOptions
+                }),
+                type: new Chart(document.getElementById('typeChart').getContext('2d'), {
+                    type: 'bar',
+                    data: { labels: c.type.labels, datasets: statusDatasets(c.type) },
+                    options: stackedOptions
+                }),
+                overall: new Chart(document.getElementById('overallChart').getContext('2d'), {
+                    type: 'doughnut',
+                    data: {
+                        labels: ['Running', 'Idle', 'Not Updated'],
+                        datasets: [{
+                            data: overall,
+                            backgroundColor: [
+                                'rgba(40, 167, 69, 0.9)',
+                                'rgba(255, 193, 7, 0.9)',
+                                'rgba(220, 53, 69, 0.9)'
+                            ]
+                        }]
+                    },
+                    options: {
+                        responsive: true,
+                        plugins: {
+                            legend: { position: 'bottom' },
+                            title: { display: false }
+                        },
+                        cutout: '55%'
+                    }
+                })
+            };
+        }
+
+        async function loadDashboard() {
+            const params = new URLSearchParams(new FormData(form));
+            history.replaceState(null, '', '?' + params);
+            document.getElementById('entryLink').href = entryUrl + '?' + params;
+            document.getElementById('trendsLink').href = trendsUrl + '?' + new URLSearchParams({
+                to: params.get('date'), location: params.get('location')
+            });
+            document.getElementById('agingLink').href = agingUrl + '?' + params;
+
+            const resp = await fetch(apiUrl + '?' + params, { cache: 'no-cache' });
+            if (!resp.ok) {
+                return;
+            }
+            const etag = resp.headers.get('ETag');
+            if (etag && etag === lastEtag) {
+                return;  // revalidated (304): nothing changed, keep the current render
+            }
+            lastEtag = etag;
+            render(await resp.json());
+        }
+
+        form.addEventListener('submit', event => {
+            event.preventDefault();
+            loadDashboard();
+        });
+        loadDashboard();
+    </script>
+
+</body>
+</html>
+"""
+
+
+TREND_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Vehicle Utilization Trends</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f5f7fb; }
+        h1, h2 { margin-bottom: 10px; }
+        table { border-collapse: collapse; width: 100%; margin-top: 10px; background: white; }
+        th, td { border: 1px solid #e0e0e0; padding: 6px; text-align: center; }
+        th { background-color: #f0f0f0; }
+        .top-bar { 
+            display: flex; 
+            gap: 20px; 
+            align-items: center; 
+            margin-bottom: 10px; 
+            flex-wrap: wrap; 
+        }
+        .btn { 
+            padding: 6px 12px; 
+            border: none; 
+            cursor: pointer; 
+            text-decoration: none; 
+            border-radius: 4px;
+            font-size: 14px;
+        }
+        .btn-primary { background-color: #007bff; color: white; }
+        .btn-back { background-color: #6c757d; color: white; }
+        select, input[type="date"] { padding: 4px; }
+        .chart-box {
+            background: white;
+            border-radius: 8px;
+            border: 1px solid #e0e0e0;
+            padding: 10px;
+            margin-top: 20px;
+            box-shadow: 0 1px 3px rgba(0,0,0,0.05);
+        }
+        canvas {
+            max-width: 100%;
+            height: 320px;
+        }
+    </style>
+    <!-- Chart.js CDN -->
+    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+</head>
+<body>
+    <h1>Vehicle Utilization Trends</h1>
+
+    <form method="get" action="{{ url_for('trends') }}">
+        <div class="top-bar">
+            <div>
+                <label>From: </label>
+                <input type="date" name="from" value="{{ start_date }}">
+            </div>
+
+            <div>
+                <label>To: </label>
+                <input type="date" name="to" value="{{ end_date }}">
+            </div>
+
+            <div>
+                <label>Location: </label>
+                <select name="location">
+                    <option value="all" {% if selected_location == 'all' %}selected{% endif %}>All Locations</option>
+                    {% for loc in locations %}
+                        <option value="{{ loc }}" {% if selected_location == loc %}selected{% endif %}>{{ loc }}</option>
+                    {% endfor %}
+                </select>
+            </div>
+
+            <div>
+                <label>Group By: </label>
+                <select name="group">
+                    <option value="location" {% if group_by == 'location' %}selected{% endif %}>Location</option>
+                    <option value="type" {% if group_by == 'type' %}selected{% endif %}>Vehicle Type</option>
+                </select>
+            </div>
+
+            <div>
+                <label>Period: </label>
+                <select name="period">
+                    <option value="day" {% if granularity == 'day' %}selected{% endif %}>Daily</option>
+                    <option value="week" {% if granularity == 'week' %}selected{% endif %}>Weekly</option>
+                    <option value="month" {% if granularity == 'month' %}selected{% endif %}>Monthly</option>
+                </select>
+            </div>
+
+            <div>
+                <button type="submit" class="btn btn-primary">Refresh</button>
+            </div>
+
+            <div>
+                <a href="{{ url_for('dashboard', date=end_date, location=selected_location) }}" class="btn btn-back">Back to Dashboard</a>
+            </div>
+        </div>
+    </form>
+
+    <div class="chart-box">
+        <b>Running as % of fixed vehicles</b>
+        <canvas id="trendChart"></canvas>
+    </div>
+
+    <h2>Utilization by {% if group_by == 'location' %}Location{% else %}Vehicle Type{% endif %}</h2>
     <table>
         <tr>
-            <th>S No</th>
-            <th>Vehicle Type</th>
-            <th>Total Count (Fixed)</th>
+            <th>Period</th>
+            <th>{% if group_by == 'location' %}Location{% else %}Vehicle Type{% endif %}</th>
+            <th>Vehicle-Days (Fixed)</th>
             <th>Running</th>
             <th>Idle (Not Running)</th>
             <th>Not Updated</th>
+            <th>Utilization %</th>
         </tr>
-        {% for row in type_summary %}
+        {% for row in trend_table %}
             <tr>
-                <td>{{ loop.index }}</td>
-                <td>{{ row.vehicle_type }}</td>
-                <td>{{ row.total_fixed }}</td>
+                <td>{{ row.bucket }}</td>
+                <td>{{ row.series }}</td>
+                <td>{{ row.total }}</td>
                 <td>{{ row.running }}</td>
                 <td>{{ row.idle }}</td>
                 <td>{{ row.not_updated }}</td>
+                <td>{{ row.utilization }}</td>
             </tr>
+        {% else %}
+            <tr><td colspan="7">No saved data in this range.</td></tr>
         {% endfor %}
-        {% if type_summary_totals %}
-            <tr>
-                <th colspan="2">TOTAL</th>
-                <th>{{ type_summary_totals.total_fixed }}</th>
-                <th>{{ type_summary_totals.running }}</th>
-                <th>{{ type_summary_totals.idle }}</th>
-                <th>{{ type_summary_totals.not_updated }}</th>
-            </tr>
-        {% endif %}
     </table>
 
     <script>
-        const locLabels = {{ chart_location_labels | tojson }};
-        const locRunning = {{ chart_location_running | tojson }};
-        const locIdle = {{ chart_location_idle | tojson }};
-        const locNotUpdated = {{ chart_location_not_updated | tojson }};
-
-        const typeLabels = {{ chart_type_labels | tojson }};
-        const typeRunning = {{ chart_type_running | tojson }};
-        const typeIdle = {{ chart_type_idle | tojson }};
-        const typeNotUpdated = {{ chart_type_not_updated | tojson }};
-
-        const overallRunning = {{ chart_overall_running | tojson }};
-        const overallIdle = {{ chart_overall_idle | tojson }};
-        const overallNotUpdated = {{ chart_overall_not_updated | tojson }};
-
-        const locationCtx = document.getElementById('locationChart').getContext('2d');
-        new Chart(locationCtx, {
-            type: 'bar',
+        const trendLabels = {{ trend_labels | tojson }};
+        const trendSeries = {{ trend_series | tojson }};
+
+        const trendCtx = document.getElementById('trendChart').getContext('2d');
+        new Chart(trendCtx, {
+            type: 'line',
             data: {
-                labels: locLabels,
-                datasets: [
-                    {
-                        label: 'Running',
-                        data: locRunning,
-                        backgroundColor: 'rgba(40, 167, 69, 0.8)'
-                    },
-                    {
-                        label: 'Idle',
-                        data: locIdle,
-                        backgroundColor: 'rgba(255, 193, 7, 0.8)'
-                    },
-                    {
-                        label: 'Not Updated',
-                        data: locNotUpdated,
-                        backgroundColor: 'rgba(220, 53, 69, 0.8)'
-                    }
-                ]
+                labels: trendLabels,
+                datasets: trendSeries.map(s => ({ label: s.label, data: s.data, spanGaps: true }))
             },
             options: {
                 responsive: true,
@@ -605,76 +1549,2783 @@ DASHBOARD_TEMPLATE = """
                     title: { display: false }
                 },
                 scales: {
-                    x: { stacked: true },
-                    y: { stacked: true, beginAtZero: true }
+                    y: { beginAtZero: true, suggestedMax: 100 }
                 }
             }
         });
+    </script>
 
-        const typeCtx = document.getElementById('typeChart').getContext('2d');
-        new Chart(typeCtx, {
-            type: 'bar',
-            data: {
-                labels: typeLabels,
-                datasets: [
-                    {
-                        label: 'Running',
-                        data: typeRunning,
-                        backgroundColor: 'rgba(40, 167, 69, 0.8)'
-                    },
-                    {
-                        label: 'Idle',
-                        data: typeIdle,
-                        backgroundColor: 'rgba(255, 193, 7, 0.8)'
-                    },
-                    {
-                        label: 'Not Updated',
-                        data: typeNotUpdated,
-                        backgroundColor: 'rgba(220, 53, 69, 0.8)'
+</body>
+</html>
+"""
+
+
+INGEST_REPORT_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Reason Import Report</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f5f7fb; }
+        h1, h2 { margin-bottom: 10px; }
+        table { border-collapse: collapse; width: 100%; margin-top: 10px; background: white; }
+        th, td { border: 1px solid #e0e0e0; padding: 6px; text-align: center; }
+        th { background-color: #f0f0f0; }
+        .btn { 
+            padding: 6px 12px; 
+            border: none; 
+            cursor: pointer; 
+            text-decoration: none; 
+            border-radius: 4px;
+            font-size: 14px;
+        }
+        .btn-back { background-color: #6c757d; color: white; }
+        .error { color: #dc3545; font-weight: bold; }
+        .warning { color: #b8860b; }
+    </style>
+</head>
+<body>
+    <h1>Reason Import Report - {{ location }} ({{ selected_date }})</h1>
+
+    <p>
+        <b>Rows read:</b> {{ report.total_rows }}
+        &nbsp;&nbsp;|&nbsp;&nbsp; <b>Inserted:</b> {{ report.inserted }}
+        &nbsp;&nbsp;|&nbsp;&nbsp; <b>Updated:</b> {{ report.updated }}
+        &nbsp;&nbsp;|&nbsp;&nbsp; <b>Deleted:</b> {{ report.deleted }}
+        &nbsp;&nbsp;|&nbsp;&nbsp; <b>Unchanged:</b> {{ report.unchanged }}
+        &nbsp;&nbsp;|&nbsp;&nbsp; <b>Rejected:</b> {{ report.rejected }}
+    </p>
+
+    <a href="{{ url_for('index', date=selected_date, location=location) }}" class="btn btn-back">Back to Entry Page</a>
+
+    {% if report.issues %}
+        <table>
+            <tr>
+                <th>Row</th>
+                <th>VECHILE NO</th>
+                <th>Level</th>
+                <th>Problem</th>
+            </tr>
+            {% for issue in report.issues %}
+                <tr>
+                    <td>{{ issue.row }}</td>
+                    <td>{{ issue.vehicle_no }}</td>
+                    <td class="{{ issue.level }}">{{ issue.level | upper }}</td>
+                    <td>{{ issue.message }}</td>
+                </tr>
+            {% endfor %}
+        </table>
+        {% if report.issues_truncated %}
+            <p>Only the first {{ report.issues | length }} problems are listed.</p>
+        {% endif %}
+    {% else %}
+        <p>Every row was saved; no problems found.</p>
+    {% endif %}
+
+</body>
+</html>
+"""
+
+
+PROFILES_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Request Profiles</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f5f7fb; }
+        h1, h2 { margin-bottom: 10px; }
+        table { border-collapse: collapse; width: 100%; margin-top: 10px; background: white; }
+        th, td { border: 1px solid #e0e0e0; padding: 6px; text-align: center; }
+        th { background-color: #f0f0f0; }
+        pre { background: white; border: 1px solid #e0e0e0; padding: 10px; overflow-x: auto; font-size: 12px; }
+        .btn { 
+            padding: 6px 12px; 
+            border: none; 
+            cursor: pointer; 
+            text-decoration: none; 
+            border-radius: 4px;
+            font-size: 14px;
+        }
+        .btn-back { background-color: #6c757d; color: white; }
+    </style>
+</head>
+<body>
+    {% if top_text %}
+        <h1>{{ name }}</h1>
+        <a href="{{ url_for('profiles') }}" class="btn btn-back">All Profiles</a>
+        <pre>{{ top_text }}</pre>
+    {% else %}
+        <h1>Request Profiles</h1>
+        <p>
+            Add <b>?profile=1</b> (cProfile) or <b>?profile=sample</b> (stack sampler) to any URL.
+            .pstats files open with snakeviz or <i>python -m pstats</i>; .folded files are collapsed
+            stacks for flamegraph.pl or speedscope.
+        </p>
+        <table>
+            <tr>
+                <th>Recorded</th>
+                <th>Request</th>
+                <th>Duration</th>
+                <th>Profiler</th>
+                <th>Size</th>
+                <th></th>
+            </tr>
+            {% for p in profiles %}
+                <tr>
+                    <td>{{ p.recorded }}</td>
+                    <td>{{ p.method }} {{ p.route }}</td>
+                    <td>{{ p.duration }}</td>
+                    <td>{{ p.kind }}</td>
+                    <td>{{ p.size_kib }} KiB</td>
+                    <td>
+                        <a href="{{ url_for('profile_file', name=p.name) }}">Download</a>
+                        {% if p.kind == "cProfile" %}
+                            | <a href="{{ url_for('profile_file', name=p.name, view='top') }}">Top functions</a>
+                        {% endif %}
+                    </td>
+                </tr>
+            {% else %}
+                <tr><td colspan="6">No profiles recorded yet.</td></tr>
+            {% endfor %}
+        </table>
+    {% endif %}
+</body>
+</html>
+"""
+
+
+REPORT_WAIT_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Preparing Report</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f5f7fb; }
+        h1 { margin-bottom: 10px; }
+        .error { color: #dc3545; font-weight: bold; }
+        .btn { 
+            padding: 6px 12px; 
+            border: none; 
+            cursor: pointer; 
+            text-decoration: none; 
+            border-radius: 4px;
+            font-size: 14px;
+        }
+        .btn-back { background-color: #6c757d; color: white; }
+    </style>
+</head>
+<body>
+    <h1>Preparing {{ filename }}</h1>
+    <p id="reportStatus">The report is being built; the download will start automatically.</p>
+    <a href="{{ url_for('index') }}" class="btn btn-back">Back to Entry Page</a>
+
+    <script>
+        const statusUrl = {{ url_for('report_status', job_id=job_id) | tojson }};
+        function poll() {
+            fetch(statusUrl, { cache: 'no-store' })
+                .then(r => r.json())
+                .then(job => {
+                    const el = document.getElementById('reportStatus');
+                    if (job.status === 'done') {
+                        el.textContent = 'Report ready.';
+                        window.location = job.download_url;
+                    } else if (job.status === 'failed') {
+                        el.className = 'error';
+                        el.textContent = 'The report failed: ' + (job.error || 'unknown error');
+                    } else {
+                        setTimeout(poll, 2000);
                     }
-                ]
+                })
+                .catch(() => setTimeout(poll, 5000));
+        }
+        poll();
+    </script>
+</body>
+</html>
+"""
+
+
+IDLE_AGING_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Idle Vehicle Aging</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f5f7fb; }
+        h1, h2 { margin-bottom: 10px; }
+        table { border-collapse: collapse; width: 100%; margin-top: 10px; background: white; }
+        th, td { border: 1px solid #e0e0e0; padding: 6px; text-align: center; }
+        th { background-color: #f0f0f0; }
+        .top-bar { 
+            display: flex; 
+            gap: 20px; 
+            align-items: center; 
+            margin-bottom: 10px; 
+            flex-wrap: wrap; 
+        }
+        .btn { 
+            padding: 6px 12px; 
+            border: none; 
+            cursor: pointer; 
+            text-decoration: none; 
+            border-radius: 4px;
+            font-size: 14px;
+        }
+        .btn-primary { background-color: #007bff; color: white; }
+        .btn-back { background-color: #6c757d; color: white; }
+        select, input[type="date"] { padding: 4px; }
+        .old { color: #dc3545; font-weight: bold; }
+        tr.total-row td { font-weight: bold; background-color: #f0f0f0; }
+    </style>
+</head>
+<body>
+    <h1>Idle Vehicle Aging</h1>
+
+    <form method="get" action="{{ url_for('idle_aging') }}">
+        <div class="top-bar">
+            <div>
+                <label>Date: </label>
+                <input type="date" name="date" value="{{ selected_date }}">
+            </div>
+
+            <div>
+                <label>Location: </label>
+                <select name="location">
+                    <option value="all" {% if selected_location == 'all' %}selected{% endif %}>All Locations</option>
+                    {% for loc in locations %}
+                        <option value="{{ loc }}" {% if selected_location == loc %}selected{% endif %}>{{ loc }}</option>
+                    {% endfor %}
+                </select>
+            </div>
+
+            <div>
+                <button type="submit" class="btn btn-primary">Refresh</button>
+            </div>
+
+            <div>
+                <a href="{{ url_for('dashboard', date=selected_date, location=selected_location) }}" class="btn btn-back">Back to Dashboard</a>
+            </div>
+        </div>
+    </form>
+
+    <h2>Days Idle by Location and Type</h2>
+    <table>
+        <tr>
+            <th>Location</th>
+            <th>Vehicle Type</th>
+            <th>Idle Vehicles</th>
+            {% for label in aging.buckets %}
+                <th>{{ label }} days</th>
+            {% endfor %}
+            <th>No Idle Date</th>
+            <th>Longest (days)</th>
+        </tr>
+        {% for row in aging.rows %}
+            <tr>
+                <td>{{ row.location }}</td>
+                <td>{{ row.vehicle_type }}</td>
+                <td>{{ row.total }}</td>
+                {% for label in aging.buckets %}
+                    <td {% if loop.last and row.buckets[label] %}class="old"{% endif %}>{{ row.buckets[label] }}</td>
+                {% endfor %}
+                <td>{{ row.unknown }}</td>
+                <td>{{ row.max_days if row.max_days is not none else '-' }}</td>
+            </tr>
+        {% else %}
+            <tr><td colspan="{{ aging.buckets | length + 5 }}">No idle reasons saved for this date.</td></tr>
+        {% endfor %}
+        {% if aging.rows %}
+            <tr class="total-row">
+                <td colspan="2">Total</td>
+                <td>{{ aging.totals.total }}</td>
+                {% for label in aging.buckets %}
+                    <td>{{ aging.totals.buckets[label] }}</td>
+                {% endfor %}
+                <td>{{ aging.totals.unknown }}</td>
+                <td></td>
+            </tr>
+        {% endif %}
+    </table>
+
+    <h2>Longest Idle</h2>
+    <table>
+        <tr>
+            <th>Location</th>
+            <th>VECHILE NO</th>
+            <th>VECHILE TYPE</th>
+            <th>OWNER</th>
+            <th>REMARKS / REASON</th>
+            <th>Idle Since</th>
+            <th>Days</th>
+        </tr>
+        {% for row in longest %}
+            <tr>
+                <td>{{ row.location }}</td>
+                <td>{{ row.vehicle_no }}</td>
+                <td>{{ row.vehicle_type }}</td>
+                <td>{{ row.owner }}</td>
+                <td>{{ row.remarks }}</td>
+                <td>{{ row.idle_since }}</td>
+                <td {% if row.days > 30 %}class="old"{% endif %}>{{ row.days }}</td>
+            </tr>
+        {% endfor %}
+    </table>
+</body>
+</html>
+"""
+
+
+SEARCH_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Vehicle Search</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f5f7fb; }
+        h1, h2 { margin-bottom: 10px; }
+        table { border-collapse: collapse; width: 100%; margin-top: 10px; background: white; }
+        th, td { border: 1px solid #e0e0e0; padding: 6px; text-align: center; }
+        th { background-color: #f0f0f0; }
+        .top-bar { 
+            display: flex; 
+            gap: 20px; 
+            align-items: center; 
+            margin-bottom: 10px; 
+            flex-wrap: wrap; 
+        }
+        .btn { 
+            padding: 6px 12px; 
+            border: none; 
+            cursor: pointer; 
+            text-decoration: none; 
+            border-radius: 4px;
+            font-size: 14px;
+        }
+        .btn-primary { background-color: #007bff; color: white; }
+        .btn-back { background-color: #6c757d; color: white; }
+        input[type="text"] { padding: 4px; width: 260px; }
+        .vehicle { background: white; border: 1px solid #e0e0e0; border-radius: 4px; padding: 10px; margin-bottom: 15px; }
+        .meta { color: #555; }
+        .pager { display: flex; gap: 10px; margin-top: 10px; }
+    </style>
+</head>
+<body>
+    <h1>Vehicle Search</h1>
+
+    <form method="get" action="{{ url_for('search') }}">
+        <div class="top-bar">
+            <div>
+                <input type="text" name="q" value="{{ q }}" placeholder="Vehicle number, owner or remarks" autofocus>
+            </div>
+
+            <div>
+                <button type="submit" class="btn btn-primary">Search</button>
+            </div>
+
+            <div>
+                <a href="{{ url_for('dashboard') }}" class="btn btn-back">Back to Dashboard</a>
+            </div>
+        </div>
+    </form>
+
+    {% if q and not results.vehicles %}
+        <p>No vehicles found for "{{ q }}".</p>
+    {% endif %}
+
+    {% for vehicle in results.vehicles %}
+        <div class="vehicle">
+            <h2>{{ vehicle.vehicle_no }}</h2>
+            <div class="meta">
+                {{ vehicle.vehicle_type }} &middot; last at <b>{{ vehicle.location }}</b> on {{ vehicle.last_seen }}
+                {% if vehicle.idle_since %} &middot; idle since {{ vehicle.idle_since }}{% endif %}
+                &middot; listed on {{ vehicle.days_listed }} day(s) since {{ vehicle.first_seen }}
+            </div>
+            <table>
+                <tr>
+                    <th>From</th>
+                    <th>To</th>
+                    <th>Days</th>
+                    <th>Location</th>
+                    <th>OWNER</th>
+                    <th>REMARKS / REASON</th>
+                    <th>Idle Since</th>
+                </tr>
+                {% for spell in vehicle.spells %}
+                    <tr>
+                        <td>{{ spell.from }}</td>
+                        <td>{{ spell.to }}</td>
+                        <td>{{ spell.days }}</td>
+                        <td>{{ spell.location }}</td>
+                        <td>{{ spell.owner }}</td>
+                        <td>{{ spell.remarks }}</td>
+                        <td>{{ spell.idle_since or '-' }}</td>
+                    </tr>
+                {% endfor %}
+            </table>
+        </div>
+    {% endfor %}
+
+    <div class="pager">
+        {% if results.page > 1 %}
+            <a href="{{ url_for('search', q=q, page=results.page - 1) }}" class="btn btn-back">Previous</a>
+        {% endif %}
+        {% if results.has_more %}
+            <a href="{{ url_for('search', q=q, page=results.page + 1) }}" class="btn btn-primary">Next</a>
+        {% endif %}
+    </div>
+</body>
+</html>
+"""
+
+
+# Templates are registered once with the app's Jinja loader. render_template()
+# then compiles each one on first use and serves the cached Template object
+# afterwards, instead of re-parsing the source on every request. Set
+# JINJA_BYTECODE_CACHE_DIR to also persist compiled bytecode across restarts.
+TEMPLATES = {
+    "main.html": MAIN_TEMPLATE,
+    "dashboard.html": DASHBOARD_TEMPLATE,
+    "trends.html": TREND_TEMPLATE,
+    "ingest_report.html": INGEST_REPORT_TEMPLATE,
+    "profiles.html": PROFILES_TEMPLATE,
+    "report_wait.html": REPORT_WAIT_TEMPLATE,
+    "idle_aging.html": IDLE_AGING_TEMPLATE,
+    "search.html": SEARCH_TEMPLATE,
+}
+
+app.jinja_env.loader = ChoiceLoader([DictLoader(TEMPLATES), app.jinja_env.loader])
+
+_bytecode_cache_dir = os.getenv("JINJA_BYTECODE_CACHE_DIR")
+if _bytecode_cache_dir:
+    os.makedirs(_bytecode_cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(_bytecode_cache_dir)
+
+
+# --- INSTRUMENTATION ---
+# Every request records wall time, SQL statement count/time and template
+# render time; /metrics exposes them as Prometheus histograms. Metrics live
+# in the worker process, so with several gunicorn workers each scrape sees
+# the worker that answered it. Requests slower than SLOW_REQUEST_MS are
+# logged with the statements that took the most time.
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "1000"))
+SLOW_REQUEST_TOP_STATEMENTS = 5
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BYTES_BUCKETS = (10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Histogram:
+    """Cumulative-bucket histogram in Prometheus text format, one series per label set."""
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for labels, (bucket_counts, count, total) in items:
+            pairs = [f'{n}="{_label_value(v)}"' for n, v in zip(self.label_names, labels)]
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                le = ",".join(pairs + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{le}}} {bucket_count}")
+            inf = ",".join(pairs + ['le="+Inf"'])
+            lines.append(f"{self.name}_bucket{{{inf}}} {count}")
+            suffix = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_count{suffix} {count}")
+            lines.append(f"{self.name}_sum{suffix} {total}")
+        return "\n".join(lines)
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Wall time per request.", ("route", "method", "status"))
+SQL_STATEMENTS = Histogram(
+    "db_statements_per_request", "SQL statements executed per request.", ("route",), COUNT_BUCKETS)
+SQL_SECONDS = Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL statements per request.", ("route",))
+TEMPLATE_SECONDS = Histogram(
+    "template_render_seconds", "Jinja render time per request.", ("route",))
+EXCEL_SECONDS = Histogram(
+    "excel_build_seconds", "Time to build an Excel report.")
+EXCEL_BYTES = Histogram(
+    "excel_build_bytes", "Size of built Excel reports.", buckets=BYTES_BUCKETS)
+
+METRICS = (REQUEST_SECONDS, SQL_STATEMENTS, SQL_SECONDS, TEMPLATE_SECONDS, EXCEL_SECONDS, EXCEL_BYTES)
+
+
+class RequestMetrics:
+    """Per-request accumulator, stored on flask.g while the request runs."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self._template_started = None
+        self.statements = {}  # statement text -> [count, seconds]
+
+    def record_statement(self, statement, seconds):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        entry = self.statements.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def top_statements(self, limit=SLOW_REQUEST_TOP_STATEMENTS):
+        ranked = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return ranked[:limit]
+
+
+def current_request_metrics():
+    if not has_request_context():
+        return None
+    return g.get("request_metrics")
+
+
+# The start time lives on the execution context, not a per-connection stack:
+# a statement that raises never reaches after_cursor_execute, and a stack
+# left behind on a pooled connection would mismatch every later duration.
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._statement_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_statement_started", None)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    metrics = current_request_metrics()
+    if metrics is not None:
+        metrics.record_statement(statement, elapsed)
+    for counter in getattr(_query_counters, "active", ()):
+        counter.statements.append(statement)
+
+
+@before_render_template.connect_via(app)
+def _start_template_timer(sender, template, context, **extra):
+    metrics = current_request_metrics()
+    if metrics is not None:
+        metrics._template_started = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def _stop_template_timer(sender, template, context, **extra):
+    metrics = current_request_metrics()
+    if metrics is not None and metrics._template_started is not None:
+        metrics.template_seconds += time.perf_counter() - metrics._template_started
+        metrics._template_started = None
+
+
+@app.before_request
+def _start_request_metrics():
+    g.request_metrics = RequestMetrics()
+
+
+@app.after_request
+def _finish_request_metrics(response):
+    metrics = current_request_metrics()
+    if metrics is None:
+        return response
+
+    elapsed = time.perf_counter() - metrics.started
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    REQUEST_SECONDS.observe(elapsed, route, request.method, str(response.status_code))
+    SQL_STATEMENTS.observe(metrics.sql_count, route)
+    SQL_SECONDS.observe(metrics.sql_seconds, route)
+    if metrics.template_seconds:
+        TEMPLATE_SECONDS.observe(metrics.template_seconds, route)
+
+    app_seconds = max(elapsed - metrics.sql_seconds - metrics.template_seconds, 0.0)
+    response.headers["Server-Timing"] = (
+        f"db;dur={metrics.sql_seconds * 1000:.1f};desc=\"{metrics.sql_count} queries\", "
+        f"tpl;dur={metrics.template_seconds * 1000:.1f}, "
+        f"app;dur={app_seconds * 1000:.1f}"
+    )
+
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        top = "".join(
+            f"\n    {seconds * 1000:8.1f} ms  x{count:<4d} {' '.join(statement.split())[:200]}"
+            for statement, (count, seconds) in metrics.top_statements()
+        )
+        logger.warning(
+            "Slow request %s %s: %.0f ms total, %d SQL statements in %.0f ms, "
+            "templates %.0f ms, python %.0f ms%s",
+            request.method, request.path, elapsed * 1000,
+            metrics.sql_count, metrics.sql_seconds * 1000,
+            metrics.template_seconds * 1000, app_seconds * 1000, top
+        )
+    return response
+
+
+def observe_excel_build(seconds, size):
+    EXCEL_SECONDS.observe(seconds)
+    EXCEL_BYTES.observe(size)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    body = "\n\n".join(h.render() for h in METRICS) + "\n"
+    return app.response_class(body, mimetype="text/plain; version=0.0.4")
+
+
+# --- QUERY BUDGETS ---
+# Each extra round trip costs tens of milliseconds against remote Postgres,
+# so N+1 patterns must be caught before they ship. count_queries() records
+# the statements run on the current thread (test client requests included);
+# query_budget() fails when a block runs more than its allowance.
+_query_counters = threading.local()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCounter()
+    active = _query_counters.__dict__.setdefault("active", [])
+    active.append(counter)
+    try:
+        yield counter
+    finally:
+        active.remove(counter)
+
+
+@contextmanager
+def query_budget(limit, label="block"):
+    with count_queries() as counter:
+        yield counter
+    if counter.count > limit:
+        listing = "".join(f"\n  {' '.join(s.split())[:200]}" for s in counter.statements)
+        raise QueryBudgetExceeded(
+            f"{label} ran {counter.count} SQL statements, budget is {limit}:{listing}"
+        )
+
+
+# --- PROFILING ---
+# Opt-in and admin-only. With PROFILING_ENABLED=1, an admin adds
+# ?profile=1 (cProfile, saved as .pstats) or ?profile=sample (stack sampler,
+# saved as collapsed stacks for flame graphs) to any URL; the file name is
+# returned in an X-Profile header and listed at /profiles. Admins send
+# ADMIN_TOKEN in an X-Admin-Token header; it is never read from the query
+# string, where it would end up in logs and links. Without ADMIN_TOKEN nobody
+# is an admin: behind a same-host proxy every request looks local.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(app.instance_path, "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "2"))
+
+# cProfile cannot run in two threads at once; concurrent requests go unprofiled
+_profile_lock = threading.Lock()
+
+
+if PROFILING_ENABLED and not ADMIN_TOKEN:
+    logger.warning("PROFILING_ENABLED is set but ADMIN_TOKEN is not; profiling stays off")
+
+
+def is_admin_request():
+    if not ADMIN_TOKEN:
+        return False
+    supplied = request.headers.get("X-Admin-Token", "")
+    return hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+
+def _frame_label(code):
+    # Keep the package path for libraries so pandas / xlsxwriter / jinja2 /
+    # sqlalchemy frames are recognisable in the flame graph
+    path = code.co_filename
+    marker = "site-packages" + os.sep
+    path = path.split(marker, 1)[1] if marker in path else os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, "w") as fh:
+            for stack, count in sorted(self.counts.items()):
+                fh.write(f"{stack} {count}\n")
+
+
+def _save_profile(kind, profiler, elapsed_ms):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", route).strip("-") or "index"
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    extension = ".folded" if kind == "sample" else ".pstats"
+    name = f"{stamp}_{request.method}_{slug}_{elapsed_ms:.0f}ms{extension}"
+    path = os.path.join(PROFILE_DIR, name)
+    if kind == "sample":
+        profiler.dump(path)
+    else:
+        profiler.dump_stats(path)
+
+    # Keep only the newest PROFILE_KEEP files
+    for old_name in sorted(os.listdir(PROFILE_DIR), reverse=True)[PROFILE_KEEP:]:
+        os.remove(os.path.join(PROFILE_DIR, old_name))
+
+    logger.info("Saved %s profile of %s %s (%.0f ms) to %s",
+                kind, request.method, request.path, elapsed_ms, name)
+    return name
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        parts = name.rsplit(".", 1)[0].split("_")
+        if len(parts) != 4:
+            continue
+        stamp, method, slug, duration = parts
+        profiles.append({
+            "name": name,
+            "recorded": datetime.strptime(stamp, "%Y%m%d-%H%M%S-%f").strftime("%Y-%m-%d %H:%M:%S"),
+            "method": method,
+            "route": slug,
+            "duration": duration,
+            "kind": "sampler" if name.endswith(".folded") else "cProfile",
+            "size_kib": round(os.path.getsize(os.path.join(PROFILE_DIR, name)) / 1024, 1),
+        })
+    return profiles
+
+
+@app.before_request
+def _start_profiler():
+    mode = request.args.get("profile")
+    if not PROFILING_ENABLED or not mode or not is_admin_request():
+        return
+    if not _profile_lock.acquire(blocking=False):
+        return
+
+    if mode == "sample":
+        kind, profiler = "sample", StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        profiler.start()
+    else:
+        kind, profiler = "cprofile", cProfile.Profile()
+        profiler.enable()
+    g.profiler = (kind, profiler, time.perf_counter())
+
+
+def _stop_profiler():
+    kind, profiler, started = g.pop("profiler")
+    try:
+        if kind == "sample":
+            profiler.stop()
+        else:
+            profiler.disable()
+    finally:
+        _profile_lock.release()
+    return kind, profiler, (time.perf_counter() - started) * 1000
+
+
+@app.after_request
+def _finish_profiler(response):
+    if "profiler" in g:
+        name = _save_profile(*_stop_profiler())
+        response.headers["X-Profile"] = name
+    return response
+
+
+@app.teardown_request
+def _abandon_profiler(exc):
+    # The view raised before after_request ran: stop without saving
+    if "profiler" in g:
+        _stop_profiler()
+
+
+@app.route("/profiles", methods=["GET"])
+def profiles():
+    if not PROFILING_ENABLED or not is_admin_request():
+        abort(404)
+    return render_template(
+        "profiles.html",
+        profiles=list_profiles(),
+        top_text=None
+    )
+
+
+@app.route("/profiles/<name>", methods=["GET"])
+def profile_file(name):
+    if not PROFILING_ENABLED or not is_admin_request():
+        abort(404)
+    path = safe_join(PROFILE_DIR, name)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    if request.args.get("view") == "top" and name.endswith(".pstats"):
+        buffer = io.StringIO()
+        pstats.Stats(path, stream=buffer).sort_stats("cumulative").print_stats(60)
+        return render_template(
+            "profiles.html",
+            name=name,
+            top_text=buffer.getvalue()
+        )
+    return send_from_directory(PROFILE_DIR, name, as_attachment=True)
+
+
+# --- BULK WRITES ---
+
+UPSERT_BATCH_SIZE = 1000
+
+
+def _dialect_insert():
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Bulk upsert is not supported on {dialect}")
+    return insert
+
+
+def upsert_daily_statuses(rows):
+    """
+    Insert or update DailyStatus rows keyed on (date, vehicle_id).
+
+    Uses a single multi-row INSERT ... ON CONFLICT DO UPDATE per batch
+    (Postgres and SQLite share the syntax). Rows whose values did not change
+    are left untouched so re-saving a page does not rewrite every tuple.
+    """
+    if not rows:
+        return
+
+    insert = _dialect_insert()
+    table = DailyStatus.__table__
+
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        stmt = insert(table).values(rows[start:start + UPSERT_BATCH_SIZE])
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.date, table.c.vehicle_id],
+            set_={
+                "running": excluded.running,
+                "idle": excluded.idle,
+                "idle_from": excluded.idle_from,
             },
-            options: {
-                responsive: true,
-                plugins: {
-                    legend: { position: 'top' },
-                    title: { display: false }
-                },
-                scales: {
-                    x: { stacked: true },
-                    y: { stacked: true, beginAtZero: true }
-                }
-            }
-        });
+            where=or_(
+                table.c.running != excluded.running,
+                table.c.idle != excluded.idle,
+                table.c.idle_from.is_not(None),
+            ),
+        )
+        db.session.execute(stmt)
+
+
+# --- EXCEL EXPORT ---
+
+EXPORT_BATCH_SIZE = 2000
+
+STATUS_SHEET_COLUMNS = ["Date", "Location", "Vehicle Type", "Total Count", "Running", "Idle"]
+REASON_SHEET_COLUMNS = [
+    "Date", "Location", "S No", "VECHILE NO", "VECHILE TYPE",
+    "OWNER", "REMARKS / REASON", "IDLE DATE"
+]
+
+
+def _write_sheet(workbook, name, columns, rows, header_format, date_format):
+    """Write `rows` (tuples, first column a date) to a new sheet, row by row."""
+    sheet = workbook.add_worksheet(name)
+    sheet.write_row(0, 0, columns, header_format)
+    row_idx = 0
+    for row_idx, row in enumerate(rows, start=1):
+        sheet.write_datetime(row_idx, 0, datetime.combine(row[0], datetime.min.time()), date_format)
+        sheet.write_row(row_idx, 1, row[1:])
+    return row_idx
+
+
+def status_export_query(start_date, end_date, location="all"):
+    """Status rows joined to their vehicle, unordered (callers pick the order)."""
+    query = (
+        db.session.query(
+            DailyStatus.date,
+            Vehicle.location,
+            Vehicle.vehicle_type,
+            Vehicle.total_count,
+            DailyStatus.running,
+            DailyStatus.idle
+        )
+        .join(Vehicle, DailyStatus.vehicle_id == Vehicle.id)
+        .filter(DailyStatus.date.between(start_date, end_date))
+    )
+    if location != "all":
+        query = query.filter(Vehicle.location == location)
+    return query
+
+
+def reason_export_query(start_date, end_date, location="all"):
+    query = (
+        db.session.query(
+            ReasonEntry.date,
+            ReasonEntry.location,
+            ReasonEntry.serial_no,
+            ReasonEntry.vehicle_no,
+            ReasonEntry.vehicle_type,
+            ReasonEntry.owner,
+            ReasonEntry.remarks,
+            ReasonEntry.idle_date
+        )
+        .filter(ReasonEntry.date.between(start_date, end_date))
+    )
+    if location != "all":
+        query = query.filter(ReasonEntry.location == location)
+    return query
+
+
+def build_excel_report(start_date, end_date, location="all"):
+    """
+    Build the Status / Reasons workbook for a date range.
+
+    Rows are streamed from the database in batches (a server-side cursor on
+    Postgres) straight into XlsxWriter in constant_memory mode, and the
+    workbook is spooled to an anonymous temp file. Memory use stays flat no
+    matter how many days are exported. Returns the open file, rewound.
+    """
+    import xlsxwriter
+
+    status_query = status_export_query(start_date, end_date, location).order_by(
+        DailyStatus.date, Vehicle.location, Vehicle.vehicle_type
+    )
+    reason_query = reason_export_query(start_date, end_date, location).order_by(
+        ReasonEntry.date, ReasonEntry.location, ReasonEntry.serial_no
+    )
+
+    started = time.perf_counter()
+    output = tempfile.TemporaryFile(suffix=".xlsx")
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "in_memory": False})
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center"})
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+
+    status_count = _write_sheet(workbook, "Status", STATUS_SHEET_COLUMNS,
+                                status_query.yield_per(EXPORT_BATCH_SIZE),
+                                header_format, date_format)
+    reason_count = _write_sheet(workbook, "Reasons", REASON_SHEET_COLUMNS,
+                                reason_query.yield_per(EXPORT_BATCH_SIZE),
+                                header_format, date_format)
+    workbook.close()
+
+    size = output.tell()
+    observe_excel_build(time.perf_counter() - started, size)
+    logger.info("Excel report %s..%s (%s): %d status rows, %d reason rows, %d bytes",
+                start_date, end_date, location, status_count, reason_count, size)
+    output.seek(0)
+    return output
+
+
+# --- BULK EXPORT ---
+# Full-history exports for analysis. Parquet files hold one row group per
+# (month, location), so readers can skip whole groups by date or location;
+# CSV is streamed to the client batch by batch. Both read through
+# yield_per (a server-side cursor on Postgres), so memory stays flat however
+# many years are exported. Column lists match the Excel sheets.
+ExportDataset = namedtuple("ExportDataset", ["query", "columns", "arrow_types", "row_order", "group_order"])
+
+EXPORT_DATASETS = {
+    "status": ExportDataset(
+        status_export_query,
+        ["date", "location", "vehicle_type", "total_count", "running", "idle"],
+        ["date32", "string", "string", "int32", "int32", "int32"],
+        (DailyStatus.date, Vehicle.location, Vehicle.vehicle_type),
+        (Vehicle.location, DailyStatus.date, Vehicle.vehicle_type),
+    ),
+    "reasons": ExportDataset(
+        reason_export_query,
+        ["date", "location", "serial_no", "vehicle_no", "vehicle_type", "owner", "remarks", "idle_date"],
+        ["date32", "string", "int32", "string", "string", "string", "string", "string"],
+        (ReasonEntry.date, ReasonEntry.location, ReasonEntry.serial_no),
+        (ReasonEntry.location, ReasonEntry.date, ReasonEntry.serial_no),
+    ),
+}
+
+
+def month_ranges(start_date, end_date):
+    """(first, last) day pairs covering start_date..end_date, one per calendar month."""
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        next_month = (chunk_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        yield chunk_start, min(end_date, next_month - timedelta(days=1))
+        chunk_start = next_month
+
+
+def write_parquet_export(dataset, start_date, end_date, location, sink):
+    """Write `dataset` for the range to `sink` (path or binary file) as zstd Parquet. Returns rows written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    spec = EXPORT_DATASETS[dataset]
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in zip(spec.columns, spec.arrow_types)])
+
+    rows_written = 0
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for month_start, month_end in month_ranges(start_date, end_date):
+            query = spec.query(month_start, month_end, location).order_by(*spec.group_order)
+            # Every dataset has location as its second column
+            for _, group in groupby(query.yield_per(EXPORT_BATCH_SIZE), key=itemgetter(1)):
+                rows = list(group)
+                columns = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema), row_group_size=len(rows))
+                rows_written += len(rows)
+
+    logger.info("Parquet export %s %s..%s (%s): %d rows", dataset, start_date, end_date, location, rows_written)
+    return rows_written
+
+
+def iter_csv_export(dataset, start_date, end_date, location):
+    """Yield the dataset as CSV text, one chunk per EXPORT_BATCH_SIZE rows."""
+    spec = EXPORT_DATASETS[dataset]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(spec.columns)
+
+    query = spec.query(start_date, end_date, location).order_by(*spec.row_order)
+    for count, row in enumerate(query.yield_per(EXPORT_BATCH_SIZE), start=1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@app.cli.command("export")
+@click.option("--dataset", type=click.Choice(sorted(EXPORT_DATASETS)), default="status")
+@click.option("--format", "fmt", type=click.Choice(["parquet", "csv"]), default="parquet")
+@click.option("--from", "from_str", help="First date (YYYY-MM-DD); default: earliest row.")
+@click.option("--to", "to_str", help="Last date (YYYY-MM-DD); default: latest row.")
+@click.option("--location", default="all")
+@click.option("--output", required=True, help="File to write.")
+def export_command(dataset, fmt, from_str, to_str, location, output):
+    """Export full status or reason history to Parquet or CSV."""
+    date_col = DailyStatus.date if dataset == "status" else ReasonEntry.date
+    first, last = db.session.query(func.min(date_col), func.max(date_col)).one()
+    start_date = datetime.strptime(from_str, "%Y-%m-%d").date() if from_str else first
+    end_date = datetime.strptime(to_str, "%Y-%m-%d").date() if to_str else last
+    if start_date is None or end_date is None:
+        print(f"No {dataset} rows to export.")
+        return
+
+    if fmt == "parquet":
+        rows = write_parquet_export(dataset, start_date, end_date, location, output)
+        print(f"Wrote {rows} {dataset} rows for {start_date}..{end_date} to {output}.")
+    else:
+        with open(output, "w", newline="") as fh:
+            for chunk in iter_csv_export(dataset, start_date, end_date, location):
+                fh.write(chunk)
+        print(f"Wrote {dataset} rows for {start_date}..{end_date} to {output}.")
+
+
+# --- PARTITIONING ---
+# On Postgres, daily_status and reason_entry can be range-partitioned by
+# month (`flask partition-tables`). Every read and write filters on date, so
+# the planner prunes to the months a request touches. Partitions are named
+# <table>_pYYYY_MM; <table>_default catches rows for months that have no
+# partition (not created yet, or archived). Old months are archived to zstd
+# Parquet and detached (`flask archive-partitions`); `flask attach-partition`
+# brings one back, from the detached table or from its Parquet file.
+PARTITIONED_TABLES = {"daily_status": DailyStatus, "reason_entry": ReasonEntry}
+# What one save replaces: a vehicle's status for a day, a location's reasons for a day
+PARTITION_SAVE_KEYS = {"daily_status": ("date", "vehicle_id"), "reason_entry": ("date", "location")}
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_ARCHIVE_DIR = os.getenv("PARTITION_ARCHIVE_DIR") or os.path.join(app.instance_path, "archive")
+
+
+def _month_start(day, months=0):
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table_name, month_start):
+    return f"{table_name}_p{month_start:%Y_%m}"
+
+
+def _require_postgres():
+    if db.engine.dialect.name != "postgresql":
+        raise click.ClickException("Table partitioning needs Postgres.")
+
+
+def _partition_parent(table_name):
+    if table_name not in PARTITIONED_TABLES:
+        raise click.ClickException(f"Choose one of: {', '.join(PARTITIONED_TABLES)}")
+    return PARTITIONED_TABLES[table_name]
+
+
+def partitioned_tables(conn):
+    """Names of the partitioned (parent) tables in the current schema; empty on SQLite."""
+    if conn.dialect.name != "postgresql":
+        return set()
+    return set(conn.execute(text(
+        "SELECT c.relname FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relnamespace = current_schema()::regnamespace"
+    )).scalars())
+
+
+def attached_partitions(conn, table_name):
+    return set(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": table_name}).scalars())
+
+
+def _table_exists(conn, name):
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def _attach_month(conn, table_name, month_start, load=None):
+    """
+    Attach the partition for one month, creating it (LIKE the parent) when it
+    does not exist; `load(conn, name)` fills a newly created table before it
+    is attached. Rows for the month that landed in the default partition
+    meanwhile are moved across first, or the attach would fail; they were
+    saved later, so they replace the partition's rows for the same
+    PARTITION_SAVE_KEYS (and would break uq_daily_status_date_vehicle).
+    """
+    name = partition_name(table_name, month_start)
+    low, high = month_start.isoformat(), _month_start(month_start, 1).isoformat()
+    if not _table_exists(conn, name):
+        conn.execute(text(
+            f'CREATE TABLE "{name}" (LIKE "{table_name}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        ))
+        if load is not None:
+            load(conn, name)
+    default = f"{table_name}_default"
+    if _table_exists(conn, default):
+        match = " AND ".join(f'p."{col}" = d."{col}"' for col in PARTITION_SAVE_KEYS[table_name])
+        replaced = conn.execute(text(
+            f'DELETE FROM "{name}" p USING "{default}" d WHERE {match} AND d.date >= :low AND d.date < :high'
+        ), {"low": low, "high": high}).rowcount
+        if replaced:
+            logger.info("Replaced %d rows of %s with later saves from %s", replaced, name, default)
+        moved = conn.execute(text(
+            f'WITH moved AS (DELETE FROM "{default}" WHERE date >= :low AND date < :high RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved'
+        ), {"low": low, "high": high}).rowcount
+        if moved:
+            logger.info("Moved %d rows from %s into %s", moved, default, name)
+    conn.execute(text(
+        f"ALTER TABLE \"{table_name}\" ATTACH PARTITION \"{name}\" FOR VALUES FROM ('{low}') TO ('{high}')"
+    ))
+    logger.info("Attached partition %s", name)
+
+
+def ensure_partitions(months_ahead=PARTITION_MONTHS_AHEAD, today=None):
+    """
+    Create monthly partitions from the current month to `months_ahead`
+    months out, for each table that is partitioned. Archived months are left
+    alone. Returns the partitions created.
+    """
+    start = _month_start(today or date.today())
+    created = []
+    with db.engine.begin() as conn:
+        for table_name in sorted(partitioned_tables(conn) & set(PARTITIONED_TABLES)):
+            attached = attached_partitions(conn, table_name)
+            for offset in range(months_ahead + 1):
+                month_start = _month_start(start, offset)
+                if partition_name(table_name, month_start) not in attached:
+                    _attach_month(conn, table_name, month_start)
+                    created.append(partition_name(table_name, month_start))
+    return created
+
+
+def partition_table(table_name, months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Rebuild a plain table as one partitioned by month on `date`, in a single
+    transaction that holds the table locked while its rows are copied. The
+    primary key becomes (id, date), as Postgres requires the partition key
+    in every unique constraint; the id sequence, defaults and foreign keys
+    carry over, and indexes are rebuilt on the parent afterwards.
+    """
+    old = f"{table_name}_unpartitioned"
+    with db.engine.begin() as conn:
+        if table_name in partitioned_tables(conn):
+            return False
+        first, last = conn.execute(text(f'SELECT min(date), max(date) FROM "{table_name}"')).one()
+        foreign_keys = conn.execute(text(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'"
+        ), {"table": table_name}).all()
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table_name}).scalar()
+
+        conn.execute(text(f'ALTER TABLE "{table_name}" RENAME TO "{old}"'))
+        conn.execute(text(f'ALTER TABLE "{old}" RENAME CONSTRAINT "{table_name}_pkey" TO "{old}_pkey"'))
+        conn.execute(text(
+            f'CREATE TABLE "{table_name}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            "PARTITION BY RANGE (date)"
+        ))
+        conn.execute(text(f'ALTER TABLE "{table_name}" ADD CONSTRAINT "{table_name}_pkey" PRIMARY KEY (id, date)'))
+        for constraint, definition in foreign_keys:
+            conn.execute(text(f'ALTER TABLE "{table_name}" ADD CONSTRAINT "{constraint}" {definition}'))
+        conn.execute(text(f'CREATE TABLE "{table_name}_default" PARTITION OF "{table_name}" DEFAULT'))
+
+        today = _month_start(date.today())
+        end = _month_start(today, months_ahead)
+        month_start = min(_month_start(first), today) if first else today
+        while month_start <= max(end, _month_start(last) if last else end):
+            conn.execute(text(
+                f'CREATE TABLE "{partition_name(table_name, month_start)}" PARTITION OF "{table_name}" '
+                f"FOR VALUES FROM ('{month_start}') TO ('{_month_start(month_start, 1)}')"
+            ))
+            month_start = _month_start(month_start, 1)
+
+        copied = conn.execute(text(f'INSERT INTO "{table_name}" SELECT * FROM "{old}"')).rowcount
+        if sequence:
+            conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY "{table_name}".id'))
+        conn.execute(text(f'DROP TABLE "{old}"'))
+    logger.info("Partitioned %s by month (%d rows copied)", table_name, copied)
+    return True
+
+
+def _bump_month_versions(month_start):
+    """Rows of a whole month came or went: pages, ETags and cached reports for it are stale."""
+    days = (_month_start(month_start, 1) - month_start).days
+    bump_data_versions(*[day_version_key(month_start + timedelta(days=offset)) for offset in range(days)])
+    db.session.commit()
+
+
+def _archive_path(name, extension):
+    return os.path.join(PARTITION_ARCHIVE_DIR, f"{name}{extension}")
+
+
+def read_archive_meta(name):
+    try:
+        with open(_archive_path(name, ".json")) as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_archive_meta(name, meta):
+    partial = _archive_path(name, f".json.{os.getpid()}.tmp")
+    with open(partial, "w") as fh:
+        json.dump(meta, fh, indent=2)
+    os.replace(partial, _archive_path(name, ".json"))
+
+
+def _arrow_type(column_type):
+    import pyarrow as pa
+
+    if isinstance(column_type, db.SmallInteger):
+        return pa.int16()
+    if isinstance(column_type, db.Integer):
+        return pa.int64()
+    if isinstance(column_type, db.Date):
+        return pa.date32()
+    return pa.string()
+
 
-        const overallCtx = document.getElementById('overallChart').getContext('2d');
-        new Chart(overallCtx, {
-            type: 'doughnut',
-            data: {
-                labels: ['Running', 'Idle', 'Not Updated'],
-                datasets: [{
-                    data: [overallRunning, overallIdle, overallNotUpdated],
-                    backgroundColor: [
-                        'rgba(40, 167, 69, 0.9)',
-                        'rgba(255, 193, 7, 0.9)',
-                        'rgba(220, 53, 69, 0.9)'
-                    ]
-                }]
-            },
-            options: {
-                responsive: true,
-                plugins: {
-                    legend: { position: 'bottom' },
-                    title: { display: false }
-                },
-                cutout: '55%'
-            }
-        });
-    </script>
+def archive_partition(table_name, month_start):
+    """
+    Write one month's partition to <PARTITION_ARCHIVE_DIR>/<partition>.parquet
+    (zstd, every model column) with a .json sidecar, and check the file holds
+    as many rows as the partition. Returns the sidecar metadata.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    name = partition_name(table_name, month_start)
+    columns = list(PARTITIONED_TABLES[table_name].__table__.columns)
+    schema = pa.schema([(col.name, _arrow_type(col.type)) for col in columns])
+    column_list = ", ".join(f'"{col.name}"' for col in columns)
+
+    os.makedirs(PARTITION_ARCHIVE_DIR, exist_ok=True)
+    partial = _archive_path(name, f".parquet.{os.getpid()}.tmp")
+    rows = 0
+    with db.engine.connect() as conn, pq.ParquetWriter(partial, schema, compression="zstd") as writer:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(
+            text(f'SELECT {column_list} FROM "{name}" ORDER BY id')
+        )
+        for batch in result.partitions():
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            rows += len(batch)
+        expected = conn.execute(text(f'SELECT count(*) FROM "{name}"')).scalar()
+
+    if pq.ParquetFile(partial).metadata.num_rows != expected or rows != expected:
+        os.remove(partial)
+        raise RuntimeError(f"Archive of {name} has {rows} rows, the partition {expected}")
+    os.replace(partial, _archive_path(name, ".parquet"))
+
+    meta = {
+        "table": table_name,
+        "partition": name,
+        "month": f"{month_start:%Y-%m}",
+        "rows": rows,
+        "bytes": os.path.getsize(_archive_path(name, ".parquet")),
+        "archived_at": datetime.now().isoformat(timespec="seconds"),
+        "dropped": False,
+    }
+    _write_archive_meta(name, meta)
+    return meta
+
+
+def _load_archive(conn, name):
+    """Insert the rows of <name>.parquet into the (new, empty) table `name`."""
+    import pyarrow.parquet as pq
+
+    path = _archive_path(name, ".parquet")
+    if not os.path.exists(path):
+        raise click.ClickException(f"{name} is neither in the database nor archived at {path}")
+    parquet = pq.ParquetFile(path)
+    target = sql_table(name, *[sql_column(field.name) for field in parquet.schema_arrow])
+    loaded = 0
+    for batch in parquet.iter_batches(batch_size=EXPORT_BATCH_SIZE):
+        conn.execute(target.insert(), batch.to_pylist())
+        loaded += batch.num_rows
+    logger.info("Restored %d rows into %s from %s", loaded, name, path)
+
+
+@app.cli.command("partition-tables")
+@click.option("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD, show_default=True)
+def partition_tables_command(months_ahead):
+    """Convert daily_status and reason_entry to monthly partitions (Postgres; locks them while copying)."""
+    _require_postgres()
+    for table_name in PARTITIONED_TABLES:
+        if not partition_table(table_name, months_ahead):
+            print(f"{table_name} is already partitioned.")
+    create_missing_indexes()
+    ensure_reason_search_schema()
+    print("Tables partitioned by month.")
+
+
+@app.cli.command("create-partitions")
+@click.option("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD, show_default=True)
+def create_partitions_command(months_ahead):
+    """Create monthly partitions ahead of time (also run by init-db)."""
+    _require_postgres()
+    created = ensure_partitions(months_ahead)
+    print(f"Created {len(created)} partitions." + (" " + ", ".join(created) if created else ""))
+
+
+@app.cli.command("archive-partitions")
+@click.option("--older-than", "months", type=int, required=True,
+              help="Archive months that ended at least this many months ago.")
+@click.option("--drop", is_flag=True, help="Drop each partition once archived, not just detach it.")
+def archive_partitions_command(months, drop):
+    """Archive old monthly partitions to Parquet and detach them."""
+    _require_postgres()
+    cutoff = _month_start(date.today(), -months)
+    with db.engine.connect() as conn:
+        candidates = sorted(
+            (table_name, name)
+            for table_name in sorted(partitioned_tables(conn) & set(PARTITIONED_TABLES))
+            for name in attached_partitions(conn, table_name)
+            if re.fullmatch(rf"{table_name}_p\d{{4}}_\d{{2}}", name)
+        )
+
+    for table_name, name in candidates:
+        month_start = datetime.strptime(name[-7:], "%Y_%m").date()
+        if month_start >= cutoff:
+            continue
+        meta = archive_partition(table_name, month_start)
+        with db.engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE "{table_name}" DETACH PARTITION "{name}"'))
+            if drop:
+                conn.execute(text(f'DROP TABLE "{name}"'))
+        _bump_month_versions(month_start)
+        meta["dropped"] = drop
+        _write_archive_meta(name, meta)
+        print(f"Archived {name}: {meta['rows']} rows, {meta['bytes']} bytes"
+              + (", dropped." if drop else ", detached."))
+
+
+@app.cli.command("attach-partition")
+@click.argument("table_name", metavar="TABLE")
+@click.argument("month", metavar="YYYY-MM")
+def attach_partition_command(table_name, month):
+    """Re-attach an archived month, restoring it from Parquet if it was dropped."""
+    _require_postgres()
+    _partition_parent(table_name)
+    month_start = datetime.strptime(month, "%Y-%m").date()
+    name = partition_name(table_name, month_start)
+    with db.engine.begin() as conn:
+        if name in attached_partitions(conn, table_name):
+            print(f"{name} is already attached.")
+            return
+        _attach_month(conn, table_name, month_start, load=_load_archive)
+    _bump_month_versions(month_start)
+
+    meta = read_archive_meta(name)
+    if meta is not None:
+        meta["dropped"] = False
+        meta["attached_at"] = datetime.now().isoformat(timespec="seconds")
+        _write_archive_meta(name, meta)
+    print(f"Attached {name}.")
+
+
+# --- DATA VERSIONS ---
+
+CATALOG_VERSION_KEY = "catalog"
+
+
+def day_version_key(selected_date):
+    return f"day:{selected_date.isoformat()}"
+
+
+def bump_data_versions(*keys):
+    """Increment the given counters inside the caller's transaction, in one statement."""
+    if not keys:
+        return
+    insert = _dialect_insert()
+    table = DataVersion.__table__
+    # Sorted and de-duplicated: one conflict per row, same lock order everywhere
+    stmt = insert(table).values([{"key": key, "version": 1} for key in sorted(set(keys))])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={"version": table.c.version + 1},
+    )
+    db.session.execute(stmt)
+
+
+def data_versions(*keys):
+    """Current counter values for `keys` (0 for never-written keys), in one query."""
+    rows = db.session.query(DataVersion.key, DataVersion.version).filter(DataVersion.key.in_(keys)).all()
+    found = dict(rows)
+    return [found.get(key, 0) for key in keys]
+
+
+def range_data_version(start_date, end_date):
+    """
+    (catalog version, days written, sum of day versions) for a date range,
+    in one query. Counters only grow, so the tuple changes whenever the
+    catalog or any day in the range is written.
+    """
+    in_range = DataVersion.key.between(day_version_key(start_date), day_version_key(end_date))
+    is_catalog = DataVersion.key == CATALOG_VERSION_KEY
+    row = db.session.query(
+        func.coalesce(func.sum(case((is_catalog, DataVersion.version), else_=0)), 0),
+        func.coalesce(func.sum(case((in_range, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((in_range, DataVersion.version), else_=0)), 0),
+    ).filter(or_(is_catalog, in_range)).one()
+    return tuple(int(value) for value in row)
+
+
+def data_etag(view, selected_date, selected_location):
+    """Strong ETag for a (view, date, location) derived from the data versions alone."""
+    catalog, day = data_versions(CATALOG_VERSION_KEY, day_version_key(selected_date))
+    raw = f"{view}|{selected_date.isoformat()}|{selected_location}|{catalog}|{day}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# --- DIMENSIONS ---
+
+def dimension_key(name):
+    """Match key for a location / vehicle type name: 'L & T excavators' -> 'LTEXCAVATORS'."""
+    return re.sub(r"[\W_]+", "", (name or "").upper())
+
+
+def _dimension_target(model):
+    """The id a dimension row resolves to: merged vehicle types resolve to their survivor."""
+    if model is VehicleType:
+        return func.coalesce(VehicleType.merged_into_id, VehicleType.id)
+    return model.id
+
+
+def dimension_ids(model, names):
+    """
+    {key: id} for `names` in a dimension table (Location or VehicleType),
+    inserting rows for names seen for the first time. Caller commits.
+
+    The catalog version is left alone: a type first seen in a reason upload
+    changes no page, report or fleet snapshot. Callers that add or re-key
+    Vehicle rows bump it themselves.
+    """
+    names_by_key = {}
+    # Sorted, so the spelling a new row is named after does not depend on input order
+    for name in sorted(names):
+        key = dimension_key(name)
+        if key:
+            names_by_key.setdefault(key, name.strip())
+    if not names_by_key:
+        return {}
+
+    lookup = db.session.query(model.key, _dimension_target(model))
+    found = dict(lookup.filter(model.key.in_(names_by_key)).all())
+    missing = [{"name": names_by_key[key], "key": key} for key in names_by_key if key not in found]
+    if missing:
+        insert = _dialect_insert()
+        stmt = insert(model.__table__).values(missing).on_conflict_do_nothing(index_elements=["key"])
+        db.session.execute(stmt)
+        found.update(lookup.filter(model.key.in_([row["key"] for row in missing])).all())
+    return found
+
+
+def location_id_of(name):
+    """Scalar subquery for the id of location `name`, so filters stay on the integer key."""
+    return select(Location.id).where(Location.key == dimension_key(name)).scalar_subquery()
+
+
+# --- VEHICLE CATALOG CACHE ---
+
+VehicleRecord = namedtuple("VehicleRecord", ["id", "location", "vehicle_type", "total_count"])
+# location_ids / type_ids map dimension_key(name) to the dimension id
+CatalogSnapshot = namedtuple("CatalogSnapshot", ["version", "locations", "vehicles", "location_ids", "type_ids"])
+
+
+class VehicleCatalog:
+    """
+    Per-process cache of the vehicle catalog as immutable records.
+
+    Each lookup reads the shared "catalog" data version (one indexed row)
+    and reloads only when another request, in any worker, has bumped it.
+    The snapshot holds plain tuples, never session-bound ORM objects, so it
+    is safe to share across threads and requests.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, version=None):
+        """`version`: the catalog version if the caller has just read it."""
+        if version is None:
+            version = data_versions(CATALOG_VERSION_KEY)[0]
+        current = self._snapshot
+        if current is not None and current.version == version:
+            return current
+
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != version:
+                rows = (
+                    db.session.query(Vehicle.id, Vehicle.location, Vehicle.vehicle_type, Vehicle.total_count)
+                    .order_by(Vehicle.location, Vehicle.vehicle_type)
+                    .all()
+                )
+                vehicles = tuple(VehicleRecord(*row) for row in rows)
+                locations = tuple(sorted({v.location for v in vehicles}))
+                location_ids = dict(db.session.query(Location.key, Location.id).all())
+                type_ids = dict(db.session.query(VehicleType.key, _dimension_target(VehicleType)).all())
+                self._snapshot = CatalogSnapshot(version, locations, vehicles, location_ids, type_ids)
+            return self._snapshot
+
+    def clear(self):
+        self._snapshot = None
+
+
+vehicle_catalog = VehicleCatalog()
+
+
+def catalog_vehicles(snapshot, selected_location="all"):
+    if selected_location == "all":
+        return list(snapshot.vehicles)
+    return [v for v in snapshot.vehicles if v.location == selected_location]
+
+
+# --- AGGREGATION ---
+
+# Vehicle's foreign key to each dimension table
+DIMENSION_COLUMNS = {Location: Vehicle.location_id, VehicleType: Vehicle.vehicle_type_id}
+
+
+def _grouped_counts(selected_date, dimension, selected_location="all"):
+    """
+    Fixed / running / idle sums per row of `dimension` (Location or
+    VehicleType) for one date.
+
+    Vehicles are LEFT JOINed to that day's statuses so vehicles without an
+    entry still count towards the fixed total. Groups on the integer key and
+    joins the dimension only for its name. Returns plain tuples:
+    (name, total_fixed, running, idle).
+    """
+    group_col = DIMENSION_COLUMNS[dimension]
+    query = (
+        db.session.query(
+            dimension.name,
+            func.coalesce(func.sum(Vehicle.total_count), 0),
+            func.coalesce(func.sum(DailyStatus.running), 0),
+            func.coalesce(func.sum(DailyStatus.idle), 0),
+        )
+        .select_from(Vehicle)
+        .join(dimension, dimension.id == group_col)
+        .outerjoin(
+            DailyStatus,
+            and_(DailyStatus.vehicle_id == Vehicle.id, DailyStatus.date == selected_date),
+        )
+    )
+    if selected_location != "all":
+        query = query.filter(Vehicle.location_id == location_id_of(selected_location))
+
+    return query.group_by(group_col, dimension.name).order_by(dimension.name).all()
+
+
+def _summary_row(key, label, total_fixed, running, idle):
+    not_updated = total_fixed - (running + idle)
+    if not_updated < 0:
+        not_updated = 0
+    return {
+        key: label,
+        "total_fixed": total_fixed,
+        "running": running,
+        "idle": idle,
+        "not_updated": not_updated
+    }
+
+
+def _summary_totals(summary):
+    if not summary:
+        return None
+    return {
+        "total_fixed": sum(row["total_fixed"] for row in summary),
+        "running": sum(row["running"] for row in summary),
+        "idle": sum(row["idle"] for row in summary),
+        "not_updated": sum(row["not_updated"] for row in summary)
+    }
+
+
+def fleet_summary(selected_date, selected_location="all"):
+    """
+    Location and vehicle-type summaries for the dashboard.
+
+    Runs two grouped queries (by location, by vehicle type) instead of
+    loading every Vehicle / DailyStatus row into the session.
+    """
+    # Keyed like the filter, so a location picked under another spelling
+    # still finds its row
+    by_location = {
+        dimension_key(loc): (loc, total_fixed, running, idle)
+        for loc, total_fixed, running, idle
+        in _grouped_counts(selected_date, Location, selected_location)
+    }
+    # A selected location with no vehicles still gets an all-zero row
+    location_keys = list(by_location) if selected_location == "all" else [dimension_key(selected_location)]
+    location_summary = [
+        _summary_row("location", *by_location.get(key, (selected_location, 0, 0, 0)))
+        for key in location_keys
+    ]
+
+    type_summary = [
+        _summary_row("vehicle_type", vehicle_type, total_fixed, running, idle)
+        for vehicle_type, total_fixed, running, idle
+        in _grouped_counts(selected_date, VehicleType, selected_location)
+    ]
+
+    location_summary_totals = _summary_totals(location_summary)
+    return {
+        "location_summary": location_summary,
+        "location_summary_totals": location_summary_totals,
+        "type_summary": type_summary,
+        "type_summary_totals": _summary_totals(type_summary),
+        "overall_totals": location_summary_totals,
+    }
+
+
+# --- DAILY ROLLUP ---
+
+def refresh_daily_rollup(start_date, end_date=None, location="all", only_status_dates=False):
+    """
+    Recompute daily_rollup rows for a date range (and optionally one location).
+
+    A single INSERT ... SELECT ... GROUP BY with ON CONFLICT DO UPDATE, so the
+    write paths only touch the few (location, type) cells of the day they
+    changed. With `only_status_dates` the range is limited to dates that have
+    status rows (used by the backfill, so gaps in history stay empty).
+    Caller commits.
+    """
+    end_date = end_date or start_date
+    insert = _dialect_insert()
+
+    if only_status_dates:
+        dates = (
+            select(DailyStatus.date.label("date"))
+            .where(DailyStatus.date.between(start_date, end_date))
+            .distinct()
+            .subquery()
+        )
+    else:
+        days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        day_selects = [select(literal(d, db.Date).label("date")) for d in days]
+        dates = (day_selects[0] if len(day_selects) == 1 else union_all(*day_selects)).subquery()
+
+    running = func.coalesce(func.sum(DailyStatus.running), 0)
+    idle = func.coalesce(func.sum(DailyStatus.idle), 0)
+    total = func.coalesce(func.sum(Vehicle.total_count), 0)
+    not_updated = case((total - running - idle > 0, total - running - idle), else_=0)
+
+    rollup_select = (
+        select(dates.c.date, Vehicle.location_id, Vehicle.vehicle_type_id, total, running, idle, not_updated)
+        .select_from(dates)
+        .join(Vehicle, true())
+        .outerjoin(
+            DailyStatus,
+            and_(DailyStatus.vehicle_id == Vehicle.id, DailyStatus.date == dates.c.date),
+        )
+        # SQLite needs a WHERE clause to parse INSERT ... SELECT ... ON CONFLICT
+        .where(true() if location == "all" else Vehicle.location_id == location_id_of(location))
+        .group_by(dates.c.date, Vehicle.location_id, Vehicle.vehicle_type_id)
+    )
+
+    table = DailyRollup.__table__
+    stmt = insert(table).from_select(
+        ["date", "location_id", "vehicle_type_id", "total", "running", "idle", "not_updated"],
+        rollup_select,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.date, table.c.location_id, table.c.vehicle_type_id],
+        set_={col: stmt.excluded[col] for col in ("total", "running", "idle", "not_updated")},
+    )
+    db.session.execute(stmt)
+
+
+def _trend_bucket(day, granularity):
+    if granularity == "month":
+        return day.strftime("%Y-%m")
+    if granularity == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    return day.strftime("%Y-%m-%d")
+
+
+def trend_summary(start_date, end_date, location="all", group_by="location", granularity="day"):
+    """
+    Utilization per bucket (day / ISO week / month) and per location or type.
+
+    Reads only daily_rollup, grouped by (date, series key) in SQL with the
+    dimension joined for names; the handful of pre-aggregated rows are
+    folded into week/month buckets in Python.
+    """
+    if group_by == "location":
+        dimension, series_key = Location, DailyRollup.location_id
+    else:
+        dimension, series_key = VehicleType, DailyRollup.vehicle_type_id
+    query = (
+        db.session.query(
+            DailyRollup.date,
+            dimension.name,
+            func.sum(DailyRollup.total),
+            func.sum(DailyRollup.running),
+            func.sum(DailyRollup.idle),
+            func.sum(DailyRollup.not_updated),
+        )
+        .join(dimension, dimension.id == series_key)
+        .filter(DailyRollup.date.between(start_date, end_date))
+    )
+    if location != "all":
+        query = query.filter(DailyRollup.location_id == location_id_of(location))
+    rows = query.group_by(DailyRollup.date, series_key, dimension.name).order_by(DailyRollup.date).all()
+
+    buckets = {}
+    for day, series, total, running, idle, not_updated in rows:
+        key = (_trend_bucket(day, granularity), series)
+        acc = buckets.setdefault(key, [0, 0, 0, 0])
+        acc[0] += total
+        acc[1] += running
+        acc[2] += idle
+        acc[3] += not_updated
+
+    labels = sorted({bucket for bucket, _ in buckets})
+    series_names = sorted({series for _, series in buckets})
+
+    table = []
+    for (bucket, series), (total, running, idle, not_updated) in sorted(buckets.items()):
+        table.append({
+            "bucket": bucket,
+            "series": series,
+            "total": total,
+            "running": running,
+            "idle": idle,
+            "not_updated": not_updated,
+            "utilization": round(100.0 * running / total, 1) if total else 0.0
+        })
+
+    utilization = {(row["bucket"], row["series"]): row["utilization"] for row in table}
+    chart_series = [
+        {"label": name, "data": [utilization.get((label, name)) for label in labels]}
+        for name in series_names
+    ]
+    return {"labels": labels, "series": chart_series, "table": table}
+
+
+# --- IDLE AGING ---
+# Buckets are (label, oldest age in days); a vehicle idle since a future
+# date counts as 0 days and one without a parseable idle date as unknown.
+IDLE_AGING_BUCKETS = (("0-3", 3), ("4-7", 7), ("8-30", 30), ("31+", None))
+LONGEST_IDLE_LIMIT = 25
+
+
+def _aging_bucket_conditions(as_of):
+    """SQL condition per bucket, as idle_since comparisons against fixed cut-off dates (index friendly)."""
+    since = ReasonEntry.idle_since
+    conditions = []
+    newer_than = None
+    for label, days in IDLE_AGING_BUCKETS:
+        cutoff = as_of - timedelta(days=days) if days is not None else None
+        parts = [since.is_not(None)]
+        if cutoff is not None:
+            parts.append(since >= cutoff)
+        if newer_than is not None:
+            parts.append(since < newer_than)
+        conditions.append((label, and_(*parts)))
+        newer_than = cutoff
+    return conditions
+
+
+def idle_aging_summary(as_of, location="all"):
+    """
+    Idle vehicles listed in the reasons for `as_of`, counted per location and
+    vehicle type by how long they have been idle. One query, grouped on the
+    dimension keys so differently typed spellings of a type count together.
+    """
+    conditions = _aging_bucket_conditions(as_of)
+    query = (
+        db.session.query(
+            Location.name,
+            VehicleType.name,
+            func.count(ReasonEntry.id),
+            *[func.sum(case((condition, 1), else_=0)) for _, condition in conditions],
+            func.sum(case((ReasonEntry.idle_since.is_(None), 1), else_=0)),
+            func.min(ReasonEntry.idle_since),
+        )
+        .join(Location, Location.id == ReasonEntry.location_id)
+        .outerjoin(VehicleType, VehicleType.id == ReasonEntry.vehicle_type_id)
+        .filter(ReasonEntry.date == as_of)
+    )
+    if location != "all":
+        query = query.filter(ReasonEntry.location_id == location_id_of(location))
+    query = query.group_by(
+        ReasonEntry.location_id, ReasonEntry.vehicle_type_id, Location.name, VehicleType.name
+    ).order_by(Location.name, VehicleType.name)
+
+    labels = [label for label, _ in IDLE_AGING_BUCKETS]
+    rows = []
+    for loc, vehicle_type, total, *counts, unknown, oldest in query:
+        rows.append({
+            "location": loc,
+            "vehicle_type": vehicle_type or "",
+            "total": int(total),
+            "buckets": dict(zip(labels, (int(c or 0) for c in counts))),
+            "unknown": int(unknown or 0),
+            "max_days": (as_of - oldest).days if oldest else None,
+        })
+
+    totals = {
+        "total": sum(r["total"] for r in rows),
+        "buckets": {label: sum(r["buckets"][label] for r in rows) for label in labels},
+        "unknown": sum(r["unknown"] for r in rows),
+    }
+    return {"buckets": labels, "rows": rows, "totals": totals}
+
+
+def longest_idle(as_of, location="all", limit=LONGEST_IDLE_LIMIT):
+    """The `limit` vehicles idle the longest as of `as_of`, oldest first."""
+    query = (
+        db.session.query(
+            ReasonEntry.location, ReasonEntry.vehicle_no, ReasonEntry.vehicle_type,
+            ReasonEntry.owner, ReasonEntry.remarks, ReasonEntry.idle_since
+        )
+        .filter(ReasonEntry.date == as_of, ReasonEntry.idle_since.is_not(None))
+    )
+    if location != "all":
+        query = query.filter(ReasonEntry.location_id == location_id_of(location))
+    rows = query.order_by(ReasonEntry.idle_since, ReasonEntry.location, ReasonEntry.serial_no).limit(limit).all()
+    return [
+        {
+            "location": loc,
+            "vehicle_no": vehicle_no,
+            "vehicle_type": vehicle_type or "",
+            "owner": owner or "",
+            "remarks": remarks or "",
+            "idle_since": idle_since.strftime("%Y-%m-%d"),
+            "days": max((as_of - idle_since).days, 0),
+        }
+        for loc, vehicle_no, vehicle_type, owner, remarks, idle_since in rows
+    ]
+
+
+# --- SEARCH ---
+# Vehicle numbers are matched by prefix on vehicle_no_norm (B-tree range),
+# owner/remarks by word prefix through the dialect's full-text index: a
+# 'simple' tsvector GIN index on Postgres, the reason_search FTS5 table on
+# SQLite (plain ILIKE when SQLite lacks FTS5). Both are created by
+# ensure_reason_search_schema().
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_TERMS = 8
+VEHICLE_NO_NOISE = r"[^0-9A-Z]"
+REASON_TSVECTOR_SQL = "to_tsvector('simple', coalesce(owner, '') || ' ' || coalesce(remarks, ''))"
+
+
+def _sqlite_has_fts5():
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE probe USING fts5(x)")
+    except sqlite3.Error:
+        return False
+    return True
+
+
+SQLITE_HAS_FTS5 = _sqlite_has_fts5()
+
+
+def normalize_vehicle_no(vehicle_no):
+    """'tn 01-ab 1234' -> 'TN01AB1234'; the form stored in vehicle_no_norm."""
+    return re.sub(VEHICLE_NO_NOISE, "", (vehicle_no or "").upper())
+
+
+def _text_match_condition(terms):
+    """Rows whose owner or remarks contain a word starting with every term."""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        return text(f"{REASON_TSVECTOR_SQL} @@ to_tsquery('simple', :tsquery)").bindparams(
+            tsquery=" & ".join(f"{term}:*" for term in terms)
+        )
+    if dialect == "sqlite" and SQLITE_HAS_FTS5:
+        return text(
+            "reason_entry.id IN (SELECT rowid FROM reason_search WHERE reason_search MATCH :match)"
+        ).bindparams(match=" ".join(f'"{term}"*' for term in terms))
+    return and_(*[
+        or_(ReasonEntry.owner.icontains(term, autoescape=True),
+            ReasonEntry.remarks.icontains(term, autoescape=True))
+        for term in terms
+    ])
+
+
+def _reason_spells(entries):
+    """Collapse one vehicle's entries (oldest first) into runs of consecutive days at one location."""
+    spells = []
+    for entry in entries:
+        spell = spells[-1] if spells else None
+        if spell and spell["location"] == entry.location and (entry.date - spell["to"]).days <= 1:
+            spell["to"] = entry.date
+        else:
+            spell = {"location": entry.location, "from": entry.date, "to": entry.date}
+            spells.append(spell)
+        spell.update(
+            vehicle_type=entry.vehicle_type or "", owner=entry.owner or "", remarks=entry.remarks or "",
+            idle_since=entry.idle_since,
+        )
+    return [
+        {
+            **spell,
+            "from": spell["from"].strftime("%Y-%m-%d"),
+            "to": spell["to"].strftime("%Y-%m-%d"),
+            "days": (spell["to"] - spell["from"]).days + 1,
+            "idle_since": spell["idle_since"].strftime("%Y-%m-%d") if spell["idle_since"] else None,
+        }
+        for spell in reversed(spells)
+    ]
+
+
+def search_reasons(q, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    Vehicles whose number starts with `q` (ignoring case, spaces and
+    punctuation) or whose owner/remarks contain words starting with every
+    word of `q`, most recently seen first. Each comes with its reason
+    timeline as spells, newest first. Two queries: a page of vehicle
+    numbers, then every entry for those vehicles.
+    """
+    prefix = normalize_vehicle_no(q)
+    terms = re.findall(r"\w+", q.lower())[:SEARCH_MAX_TERMS]
+    result = {"q": q, "page": page, "page_size": page_size, "has_more": False, "vehicles": []}
+    if not prefix and not terms:
+        return result
+
+    norm = ReasonEntry.vehicle_no_norm
+    conditions = []
+    if prefix:
+        # "~" sorts after every character a normalized number can hold
+        conditions.append(and_(norm >= prefix, norm < prefix + "~"))
+    if terms:
+        conditions.append(_text_match_condition(terms))
+
+    last_seen = func.max(ReasonEntry.date).label("last_seen")
+    numbers = (
+        db.session.query(norm, last_seen)
+        .filter(or_(*conditions), norm.is_not(None), norm != "")
+        .group_by(norm)
+        .order_by(last_seen.desc(), norm)
+        .offset((page - 1) * page_size)
+        .limit(page_size + 1)
+        .all()
+    )
+    result["has_more"] = len(numbers) > page_size
+    numbers = [number for number, _ in numbers[:page_size]]
+    if not numbers:
+        return result
+
+    entries = (
+        db.session.query(
+            ReasonEntry.vehicle_no_norm, ReasonEntry.vehicle_no, ReasonEntry.date, ReasonEntry.location,
+            ReasonEntry.vehicle_type, ReasonEntry.owner, ReasonEntry.remarks, ReasonEntry.idle_since
+        )
+        .filter(norm.in_(numbers))
+        .order_by(norm, ReasonEntry.date, ReasonEntry.location)
+        .all()
+    )
+    timelines = {number: list(rows) for number, rows in groupby(entries, key=itemgetter(0))}
+
+    for number in numbers:
+        rows = timelines[number]
+        latest = rows[-1]
+        result["vehicles"].append({
+            "vehicle_no": latest.vehicle_no,
+            "vehicle_no_norm": number,
+            "vehicle_type": latest.vehicle_type or "",
+            "first_seen": rows[0].date.strftime("%Y-%m-%d"),
+            "last_seen": latest.date.strftime("%Y-%m-%d"),
+            "days_listed": len({row.date for row in rows}),
+            "location": latest.location,
+            "owner": latest.owner or "",
+            "remarks": latest.remarks or "",
+            "idle_since": latest.idle_since.strftime("%Y-%m-%d") if latest.idle_since else None,
+            "spells": _reason_spells(rows),
+        })
+    return result
+
+
+# --- REASON INGESTION ---
+
+# Column order after the optional leading S NO
+REASON_COLUMNS = ["vehicle_no", "vehicle_type", "owner", "remarks", "idle_date"]
+REASON_HEADER_NAMES = {"S NO", "S.NO", "SNO", "VECHILE NO", "VEHICLE NO"}
+IDLE_DATE_FORMATS = (
+    "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%Y", "%Y-%m-%d",
+    "%d-%m-%y", "%d.%m.%y", "%d/%m/%y",
+)
+INGEST_CHUNK_ROWS = 5000
+INSERT_BATCH_SIZE = 1000
+MAX_REPORTED_ISSUES = 500
+
+
+class UnreadableUpload(ValueError):
+    """An uploaded reasons file that cannot be decoded or opened; shown to the user as a 400."""
+
+
+def sniff_upload_encoding(stream, block_size=1 << 16):
+    """
+    "utf-8-sig" when the whole (seekable) byte stream decodes as UTF-8, else
+    "cp1252", what Excel's "CSV (Comma delimited)" writes on Windows. One
+    pass over the bytes up front, so chunks are never half-ingested before
+    a decode error. Rewinds the stream.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        while block := stream.read(block_size):
+            decoder.decode(block)
+        decoder.decode(b"", final=True)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1252"
+    finally:
+        stream.seek(0)
+
+
+def read_delimited_chunks(source, sep="\t", encoding=None):
+    """
+    Parse pasted TSV (or an uploaded CSV/TSV byte stream) with the csv
+    module's C reader, INGEST_CHUNK_ROWS rows at a time. Every cell is read
+    as a string and rows are padded or cut to S NO + the five reason
+    columns. pandas' parser cannot do both: with usecols it rejects a paste
+    whose first row is short (five columns, no S NO), without it any longer
+    row. Blank lines are kept so reported row numbers match the pasted lines.
+
+    Tab-separated text is split literally, one line per row, as the paste
+    box always has: a cell starting with '"' must not swallow the lines
+    after it. CSV keeps its quoting (Excel quotes cells with commas).
+    """
+    import pandas as pd
+
+    width = len(REASON_COLUMNS) + 1
+    if not isinstance(source, io.TextIOBase):
+        source = io.TextIOWrapper(source, encoding=encoding or sniff_upload_encoding(source), newline="")
+    rows = []
+    quoting = csv.QUOTE_NONE if sep == "\t" else csv.QUOTE_MINIMAL
+    try:
+        for row in csv.reader(source, delimiter=sep, quoting=quoting):
+            rows.append(row[:width] + [""] * (width - len(row)))
+            if len(rows) == INGEST_CHUNK_ROWS:
+                yield pd.DataFrame(rows)
+                rows = []
+    except UnicodeDecodeError as exc:
+        raise UnreadableUpload(f"The file is not UTF-8 or Windows-1252 text ({exc.reason}); "
+                               "save it again as CSV UTF-8") from exc
+    except csv.Error as exc:
+        raise UnreadableUpload(f"The file is not valid CSV: {exc}") from exc
+    if rows:
+        yield pd.DataFrame(rows)
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%d-%m-%Y")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def read_xlsx_chunks(stream):
+    """Stream the first sheet of an .xlsx upload in read-only mode, in chunks."""
+    import openpyxl
+    import pandas as pd
+
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    width = len(REASON_COLUMNS) + 1
+    try:
+        workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as exc:
+        # KeyError: a zip archive without the workbook parts
+        raise UnreadableUpload("The file is not a valid .xlsx workbook") from exc
+    try:
+        rows = []
+        for row in workbook.worksheets[0].iter_rows(max_col=width, values_only=True):
+            rows.append([_xlsx_cell(v) for v in row] + [""] * (width - len(row)))
+            if len(rows) == INGEST_CHUNK_ROWS:
+                yield pd.DataFrame(rows)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows)
+    finally:
+        workbook.close()
+
+
+def parse_idle_dates(raw):
+    """
+    Parse a Series of idle-date strings with IDLE_DATE_FORMATS (first match
+    wins). Returns an object Series of datetime.date, None where unparsed.
+    """
+    import pandas as pd
+
+    parsed = pd.Series(pd.NaT, index=raw.index, dtype="datetime64[ns]")
+    for fmt in IDLE_DATE_FORMATS:
+        parsed = parsed.fillna(pd.to_datetime(raw, format=fmt, errors="coerce"))
+    return parsed.dt.date.astype(object).where(parsed.notna(), None)
+
+
+def normalize_reason_chunk(chunk, row_offset, last_serial):
+    """
+    Turn one chunk of raw string cells into ReasonEntry values, column-wise.
+
+    A leading integer column is taken as S NO; rows without one continue
+    numbering from the previous row, as the paste box always has. A blank
+    S NO cell (a leading tab from Excel) is skipped the same way. Returns
+    (records, issues, last_serial) where issues lists rejected rows (errors)
+    and suspicious but saved rows (warnings).
+    """
+    import numpy as np
+    import pandas as pd
+
+    width = len(REASON_COLUMNS) + 1
+    cells = chunk.reset_index(drop=True).reindex(columns=range(width)).fillna("").astype(str)
+    cells = cells.apply(lambda col: col.str.strip())
+    row_numbers = cells.index.to_numpy() + row_offset + 1
+
+    # Drop blank rows and Excel header rows (common in uploads)
+    header = cells[0].str.upper().isin(REASON_HEADER_NAMES) | cells[1].str.upper().isin(REASON_HEADER_NAMES)
+    keep_rows = ((cells != "").any(axis=1) & ~header).to_numpy()
+    cells = cells[keep_rows].reset_index(drop=True)
+    row_numbers = row_numbers[keep_rows]
+    if cells.empty:
+        return [], [], last_serial
+
+    first = cells[0]
+    has_sno = first.str.fullmatch(r"\d+")
+    blank_sno = (first == "") & (cells[1] != "")
+    values = pd.DataFrame({
+        name: cells[i + 1].where(has_sno | blank_sno, cells[i])
+        for i, name in enumerate(REASON_COLUMNS)
+    })
+
+    # Serial numbers: explicit S NO, else previous serial + 1
+    group = has_sno.cumsum().to_numpy()
+    step = values.groupby(group).cumcount().to_numpy()
+    explicit = pd.to_numeric(first.where(has_sno), errors="coerce").ffill().to_numpy()
+    serial = np.where(group == 0, last_serial + step + 1, explicit + step).astype(int)
+    values["serial_no"] = serial
+
+    errors = pd.Series("", index=values.index)
+    errors = errors.mask(values["vehicle_no"] == "", "missing vehicle number")
+    for name in REASON_COLUMNS:
+        limit = ReasonEntry.__table__.c[name].type.length
+        too_long = values[name].str.len() > limit
+        errors = errors.mask(too_long & (errors == ""), f"{name} longer than {limit} characters")
+
+    values["idle_since"] = parse_idle_dates(values["idle_date"])
+    values["vehicle_no_norm"] = values["vehicle_no"].str.upper().str.replace(VEHICLE_NO_NOISE, "", regex=True)
+    bad_date = (values["idle_date"] != "") & values["idle_since"].isna()
+
+    rejected = errors != ""
+    issues = [
+        {"row": int(row), "vehicle_no": vehicle_no, "level": "error", "message": message}
+        for row, vehicle_no, message in zip(
+            row_numbers[rejected.to_numpy()], values["vehicle_no"][rejected], errors[rejected]
+        )
+    ]
+    warned = bad_date & ~rejected
+    issues += [
+        {"row": int(row), "vehicle_no": vehicle_no, "level": "warning",
+         "message": f"idle date '{idle_date}' is not DD-MM-YYYY; saved as text"}
+        for row, vehicle_no, idle_date in zip(
+            row_numbers[warned.to_numpy()], values["vehicle_no"][warned], values["idle_date"][warned]
+        )
+    ]
+
+    issues.sort(key=lambda issue: issue["row"])
+    records = values[~rejected].to_dict("records")
+    return records, issues, int(serial[-1])
+
+
+def _normalized_reason_records(chunks, selected_date, location, report):
+    """Yield the accepted records of each chunk, collecting issues into `report`."""
+    row_offset = 0
+    last_serial = 0
+
+    snapshot = vehicle_catalog.snapshot()
+    location_key = dimension_key(location)
+    location_id = snapshot.location_ids.get(location_key)
+    if location_id is None:
+        location_id = dimension_ids(Location, [location]).get(location_key)
+    type_ids = dict(snapshot.type_ids)
+
+    for chunk in chunks:
+        records, issues, last_serial = normalize_reason_chunk(chunk, row_offset, last_serial)
+        row_offset += len(chunk)
+        report["total_rows"] += len(chunk)
+
+        report["rejected"] += sum(1 for issue in issues if issue["level"] == "error")
+        room = MAX_REPORTED_ISSUES - len(report["issues"])
+        if len(issues) > room:
+            report["issues_truncated"] = True
+        report["issues"].extend(issues[:max(room, 0)])
+
+        type_keys = {name: dimension_key(name) for name in {record["vehicle_type"] for record in records}}
+        new_types = [name for name, key in type_keys.items() if key and key not in type_ids]
+        if new_types:
+            type_ids.update(dimension_ids(VehicleType, new_types))
+
+        for record in records:
+            record["date"] = selected_date
+            record["location"] = location
+            record["location_id"] = location_id
+            record["vehicle_type_id"] = type_ids.get(type_keys[record["vehicle_type"]])
+        yield records
+
+
+def _insert_reason_records(records):
+    table = ReasonEntry.__table__
+    for start in range(0, len(records), INSERT_BATCH_SIZE):
+        db.session.execute(table.insert(), records[start:start + INSERT_BATCH_SIZE])
+
+
+def reconcile_reasons(incoming, selected_date, location):
+    """
+    Diff `incoming` records against the saved reasons for (date, location).
+
+    Rows are matched on vehicle_no first (so inserting a line does not
+    renumber-and-rewrite everything below it), then on serial_no (so a
+    corrected vehicle number updates its row in place). Only changed rows
+    are UPDATEd, new rows INSERTed and unmatched saved rows DELETEd.
+    Returns counts of inserted / updated / deleted / unchanged rows.
+    """
+    fields = ["serial_no"] + REASON_COLUMNS + ["idle_since", "vehicle_no_norm", "location_id", "vehicle_type_id"]
+    existing = {
+        row[0]: dict(zip(fields, row[1:]))
+        for row in db.session.query(ReasonEntry.id, *[getattr(ReasonEntry, f) for f in fields])
+        .filter(ReasonEntry.date == selected_date, ReasonEntry.location == location)
+    }
+
+    by_vehicle = {}
+    by_serial = {}
+    for row_id, values in existing.items():
+        by_vehicle.setdefault(values["vehicle_no"], []).append(row_id)
+        by_serial.setdefault(values["serial_no"], []).append(row_id)
+
+    matched = {}
+    unmatched = []
+    for record in incoming:
+        row_id = next((i for i in by_vehicle.get(record["vehicle_no"], []) if i not in matched), None)
+        if row_id is None:
+            unmatched.append(record)
+        else:
+            matched[row_id] = record
+    to_insert = []
+    for record in unmatched:
+        row_id = next((i for i in by_serial.get(record["serial_no"], []) if i not in matched), None)
+        if row_id is None:
+            to_insert.append(record)
+        else:
+            matched[row_id] = record
+
+    # Older rows may hold NULL where new records carry ""
+    def changed(saved, record):
+        return any(
+            (saved[f] if saved[f] is not None else "") != (record[f] if record[f] is not None else "")
+            for f in fields
+        )
+
+    to_update = [
+        {"row_id": row_id, **{f: record[f] for f in fields}}
+        for row_id, record in matched.items()
+        if changed(existing[row_id], record)
+    ]
+    to_delete = [row_id for row_id in existing if row_id not in matched]
+
+    # Every statement also matches on date, so a partitioned reason_entry
+    # only touches the day's partition
+    if to_delete:
+        for start in range(0, len(to_delete), INSERT_BATCH_SIZE):
+            ReasonEntry.query.filter(
+                ReasonEntry.date == selected_date,
+                ReasonEntry.id.in_(to_delete[start:start + INSERT_BATCH_SIZE])
+            ).delete(synchronize_session=False)
+    if to_update:
+        table = ReasonEntry.__table__
+        stmt = update(table).where(table.c.id == bindparam("row_id"), table.c.date == selected_date)
+        db.session.execute(stmt, to_update)
+    _insert_reason_records(to_insert)
+
+    return {
+        "inserted": len(to_insert),
+        "updated": len(to_update),
+        "deleted": len(to_delete),
+        "unchanged": len(matched) - len(to_update),
+    }
+
+
+def ingest_reasons(chunks, selected_date, location, mode="reconcile"):
+    """
+    Save parsed reason rows for (date, location).
+
+    mode="reconcile" (default) diffs against the saved rows and writes only
+    what changed. mode="replace" deletes everything for the day and inserts
+    chunk by chunk, so memory stays bounded by the chunk size for very large
+    files. Returns a per-row validation report with write counts. Caller
+    commits, so either mode is a single transaction.
+    """
+    report = {
+        "mode": mode, "total_rows": 0, "rejected": 0, "issues": [], "issues_truncated": False,
+        "inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0,
+    }
+    batches = _normalized_reason_records(chunks, selected_date, location, report)
+
+    if mode == "replace":
+        report["deleted"] = ReasonEntry.query.filter_by(date=selected_date, location=location).delete()
+        for records in batches:
+            _insert_reason_records(records)
+            report["inserted"] += len(records)
+    else:
+        incoming = [record for records in batches for record in records]
+        report.update(reconcile_reasons(incoming, selected_date, location))
+
+    return report
+
+
+# --- RESPONSE CACHE ---
+
+def page_cache_key(view, selected_date, selected_location):
+    """
+    (cache key, catalog version) for a rendered page. The key carries the
+    catalog and day data versions, so a write from any worker, host or CLI
+    command makes older entries unreachable; they age out of the LRU.
+    """
+    catalog, day = data_versions(CATALOG_VERSION_KEY, day_version_key(selected_date))
+    return (view, selected_date.isoformat(), selected_location, f"{catalog}.{day}"), catalog
+
+
+class ResponseCache:
+    """
+    In-process LRU of rendered pages keyed by page_cache_key().
+
+    Bounded to `max_entries`; the least recently used page is evicted first.
+    Only valid for a single worker process — use SQLiteResponseCache when
+    several workers must see each other's invalidations.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_date(self, selected_date):
+        day = selected_date.isoformat()
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == day]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteResponseCache:
+    """
+    Same interface as ResponseCache, stored in a local SQLite file so every
+    worker on the host shares entries and invalidations. LRU order is kept
+    with an access timestamp; the table is trimmed to `max_entries` on write.
+    Hits only read: their timestamps are queued in memory and written with
+    the next set(), so readers never wait on the write lock.
+    """
+
+    def __init__(self, path, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self._touched = {}
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(response_cache)")]
+            if columns and "versions" not in columns:
+                # Entries from before pages were keyed by data version
+                conn.execute("DROP TABLE response_cache")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "view TEXT, day TEXT, location TEXT, versions TEXT, body TEXT, accessed REAL, "
+                "PRIMARY KEY (view, day, location, versions))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # sqlite3's own context manager only scopes the transaction; close too
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT body FROM response_cache WHERE view = ? AND day = ? AND location = ? AND versions = ?",
+                key
+            ).fetchone()
+        if row is None:
+            return None
+        with self._lock:
+            self._touched[key] = time.time()
+        return row[0]
+
+    def set(self, key, value):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE response_cache SET accessed = ? "
+                "WHERE view = ? AND day = ? AND location = ? AND versions = ?",
+                [(accessed, *touched_key) for touched_key, accessed in touched.items()]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, value, time.time())
+            )
+            conn.execute(
+                "DELETE FROM response_cache WHERE rowid NOT IN ("
+                "SELECT rowid FROM response_cache ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+    def invalidate_date(self, selected_date):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM response_cache WHERE day = ?", (selected_date.isoformat(),))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM response_cache")
+
+
+def make_response_cache():
+    """RESPONSE_CACHE_PATH selects the shared SQLite store; otherwise in-process."""
+    max_entries = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+    path = os.getenv("RESPONSE_CACHE_PATH")
+    if path:
+        logger.info("Using shared response cache at %s", path)
+        return SQLiteResponseCache(path, max_entries)
+    return ResponseCache(max_entries)
+
+
+response_cache = make_response_cache()
 
-</body>
-</html>
-"""
+
+# --- REPORT JOBS ---
+# Excel reports are content-addressed: the key hashes the parameters and
+# the data versions covering them, so a finished .xlsx in REPORT_CACHE_DIR
+# is served as-is until something in its range is written again. Long
+# ranges are built by a small thread pool while the browser polls; the
+# cache directory is shared by every worker on the host and trimmed to
+# REPORT_CACHE_MAX_MB, least recently used first.
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR") or os.path.join(app.instance_path, "reports")
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_MB", "200")) * 1024 * 1024
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_INLINE_MAX_DAYS = int(os.getenv("REPORT_INLINE_MAX_DAYS", "31"))
+REPORT_JOB_TIMEOUT = int(os.getenv("REPORT_JOB_TIMEOUT", "900"))
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def report_filename(start_date, end_date, location):
+    if start_date == end_date:
+        period = f"{start_date}"
+    else:
+        period = f"{start_date}_to_{end_date}"
+
+    if location != "all":
+        safe_loc = str(location).replace(" ", "_")
+        return f"vehicle_report_{safe_loc}_{period}.xlsx"
+    return f"vehicle_report_{period}.xlsx"
+
+
+def report_key(start_date, end_date, location):
+    versions = range_data_version(start_date, end_date)
+    raw = f"xlsx|{start_date.isoformat()}|{end_date.isoformat()}|{location}|{versions}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def report_meta(start_date, end_date, location):
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "location": location,
+        "filename": report_filename(start_date, end_date, location),
+        "created": time.time(),
+    }
+
+
+class ReportStore:
+    """
+    Finished reports on disk as <key>.xlsx, plus <key>.json metadata
+    (parameters, filename, state) visible to every worker process.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, f"{key}{extension}")
+
+    def get(self, key):
+        """Path of the finished report, or None. Refreshes its LRU position."""
+        path = self._path(key, ".xlsx")
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def open_report(self, key):
+        """
+        The finished report opened for reading, or None. Refreshes its LRU
+        position. The open file stays readable even if another worker
+        evicts the report before it has been sent.
+        """
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, fileobj):
+        os.makedirs(self.directory, exist_ok=True)
+        partial = self._path(key, f".xlsx.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(partial, "wb") as fh:
+            shutil.copyfileobj(fileobj, fh)
+        os.replace(partial, self._path(key, ".xlsx"))
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """
+        Trim finished reports to max_bytes, least recently used first, with
+        their sidecars; report `keep` (the one just written) always stays,
+        even when it alone is over the limit. Sidecars without a report
+        (failed or abandoned jobs) and partial files go once untouched for
+        REPORT_JOB_TIMEOUT.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        stale_before = time.time() - REPORT_JOB_TIMEOUT
+        names = set(os.listdir(self.directory))
+        reports = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if name.endswith(".xlsx"):
+                stat = os.stat(path)
+                reports.append((stat.st_mtime, stat.st_size, name))
+            elif name.endswith(".tmp") or (name.endswith(".json") and name[:-len(".json")] + ".xlsx" not in names):
+                try:
+                    if os.stat(path).st_mtime < stale_before:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+        total = sum(size for _, size, _ in reports)
+        for _, size, name in sorted(reports):
+            if total <= self.max_bytes:
+                break
+            key = name[:-len(".xlsx")]
+            if key == keep:
+                continue
+            for extension in (".xlsx", ".json"):
+                try:
+                    os.remove(self._path(key, extension))
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def read_meta(self, key):
+        try:
+            with open(self._path(key, ".json")) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write_meta(self, key, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        partial = self._path(key, f".json.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(partial, "w") as fh:
+            json.dump(meta, fh)
+        os.replace(partial, self._path(key, ".json"))
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+
+
+class ReportJobs:
+    """Builds reports on a thread pool; job ids are the report keys."""
+
+    def __init__(self, store, workers):
+        self.store = store
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Created on first use, after gunicorn has forked the workers
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="report")
+            return self._executor
+
+    def status(self, key):
+        meta = self.store.read_meta(key)
+        if self.store.get(key) is not None:
+            state = "done"
+        elif meta is None:
+            return None
+        elif meta["status"] in ("queued", "running") and time.time() - meta["updated"] > REPORT_JOB_TIMEOUT:
+            state = "failed"  # the worker building it went away
+            meta["error"] = "report build timed out"
+        else:
+            state = meta["status"]
+        return dict(meta or {}, job_id=key, status=state)
+
+    def _set_state(self, key, meta, state, **extra):
+        meta = dict(meta, status=state, updated=time.time(), **extra)
+        self.store.write_meta(key, meta)
+        return meta
+
+    def submit(self, key, start_date, end_date, location):
+        """Queue a build unless the report is already finished or in progress."""
+        current = self.status(key)
+        if current is not None and current["status"] in ("done", "queued", "running"):
+            return current
+
+        meta = self._set_state(key, report_meta(start_date, end_date, location), "queued")
+        self._pool().submit(self._run, key, meta, start_date, end_date, location)
+        return dict(meta, job_id=key)
+
+    def build(self, key, meta, start_date, end_date, location):
+        """
+        Build in the calling thread and store the artifact. Returns the built
+        file rewound (caller closes it) rather than the stored copy, which
+        another worker's eviction may already have removed.
+        """
+        started = time.perf_counter()
+        output = build_excel_report(start_date, end_date, location)
+        try:
+            self.store.put(key, output)
+        except BaseException:
+            output.close()
+            raise
+        self._set_state(key, meta, "done", seconds=round(time.perf_counter() - started, 2))
+        output.seek(0)
+        return output
+
+    def _run(self, key, meta, start_date, end_date, location):
+        meta = self._set_state(key, meta, "running")
+        try:
+            with app.app_context():
+                self.build(key, meta, start_date, end_date, location).close()
+        except Exception as exc:
+            logger.exception("Report job %s failed", key)
+            self._set_state(key, meta, "failed", error=str(exc))
+            self.store.evict()
+
+
+report_store = ReportStore(REPORT_CACHE_DIR, REPORT_CACHE_MAX_BYTES)
+report_jobs = ReportJobs(report_store, REPORT_WORKERS)
 
 
 # --- ROUTES ---
@@ -689,14 +4340,14 @@ def index():
 
     selected_location = request.args.get("location", "all")
 
-    loc_rows = db.session.query(Vehicle.location).distinct().order_by(Vehicle.location).all()
-    locations = [r[0] for r in loc_rows]
-
-    vehicle_query = Vehicle.query
-    if selected_location != "all":
-        vehicle_query = vehicle_query.filter_by(location=selected_location)
+    cache_key, catalog_version = page_cache_key("index", selected_date, selected_location)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-    vehicles = vehicle_query.order_by(Vehicle.location, Vehicle.vehicle_type).all()
+    catalog = vehicle_catalog.snapshot(catalog_version)
+    locations = catalog.locations
+    vehicles = catalog_vehicles(catalog, selected_location)
 
     statuses = DailyStatus.query.filter_by(date=selected_date).all()
     status_by_vehicle = {s.vehicle_id: s for s in statuses}
@@ -717,14 +4368,16 @@ def index():
             .all()
         )
 
-    return render_template_string(
-        MAIN_TEMPLATE,
+    html = render_template(
+        "main.html",
         selected_date=selected_date.strftime("%Y-%m-%d"),
         rows=rows,
         locations=locations,
         selected_location=selected_location,
         reasons=reasons
     )
+    response_cache.set(cache_key, html)
+    return html
 
 
 @app.route("/save", methods=["POST"])
@@ -734,19 +4387,18 @@ def save():
     selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
 
     # Only update vehicles for the current view
-    if selected_location == "all":
-        vehicles = Vehicle.query.order_by(Vehicle.location, Vehicle.vehicle_type).all()
-    else:
-        vehicles = Vehicle.query.filter_by(location=selected_location).order_by(
-            Vehicle.location, Vehicle.vehicle_type
-        ).all()
+    vehicles = catalog_vehicles(vehicle_catalog.snapshot(), selected_location)
 
+    status_rows = []
+    total_updates = []
     for v in vehicles:
         # --- Update total count if provided ---
         total_raw = request.form.get(f"total_{v.id}", "").strip()
         if total_raw != "":
             try:
-                v.total_count = int(total_raw)
+                total_count = int(total_raw)
+                if total_count != v.total_count:
+                    total_updates.append({"id": v.id, "total_count": total_count})
             except ValueError:
                 pass  # ignore bad input
 
@@ -760,17 +4412,27 @@ def save():
         running = int(running_raw) if running_raw != "" else 0
         idle = int(idle_raw) if idle_raw != "" else 0
 
-        status = DailyStatus.query.filter_by(date=selected_date, vehicle_id=v.id).first()
-        if not status:
-            status = DailyStatus(date=selected_date, vehicle_id=v.id)
-
-        status.running = running
-        status.idle = idle
-        status.idle_from = None
-
-        db.session.add(status)
+        status_rows.append({
+            "date": selected_date,
+            "vehicle_id": v.id,
+            "running": running,
+            "idle": idle,
+            "idle_from": None
+        })
 
+    catalog_changed = bool(total_updates)
+    if catalog_changed:
+        db.session.execute(update(Vehicle), total_updates)
+    upsert_daily_statuses(status_rows)
+    refresh_daily_rollup(selected_date, location=selected_location)
+    bump_data_versions(day_version_key(selected_date), *([CATALOG_VERSION_KEY] if catalog_changed else []))
     db.session.commit()
+
+    # Fixed totals show on every date's pages; status rows only on this date's
+    if catalog_changed:
+        response_cache.clear()
+    else:
+        response_cache.invalidate_date(selected_date)
     return redirect(url_for("index",
                             date=selected_date.strftime("%Y-%m-%d"),
                             location=selected_location))
@@ -784,151 +4446,191 @@ def save_reasons():
 
     selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
 
-    # Remove old reasons for this date + location and re-insert
-    ReasonEntry.query.filter_by(date=selected_date, location=location).delete()
+    # Expect from Excel: columns separated by TAB
+    # Either: S NO, VEHICLE NO, VEHICLE TYPE, OWNER, REMARKS/REASON, IDLE DATE
+    # or:    VEHICLE NO, VEHICLE TYPE, OWNER, REMARKS/REASON, IDLE DATE
+    chunks = read_delimited_chunks(io.StringIO(raw)) if raw else []
+    report = ingest_reasons(chunks, selected_date, location, _reason_save_mode())
+    return _finish_reason_ingest(report, selected_date, location)
 
-    serial_no = 1
-    if raw:
-        for line in raw.splitlines():
-            line = line.strip()
-            if not line:
-                continue
 
-            # Expect from Excel: columns separated by TAB
-            # Either: S NO, VEHICLE NO, VEHICLE TYPE, OWNER, REMARKS/REASON, IDLE DATE
-            # or:    VEHICLE NO, VEHICLE TYPE, OWNER, REMARKS/REASON, IDLE DATE
-            parts = [p.strip() for p in line.split("\t") if p.strip()]
+@app.route("/upload_reasons", methods=["POST"])
+def upload_reasons():
+    date_str = request.form.get("date")
+    location = request.form.get("location")
+    upload = request.files.get("reasons_file")
 
-            if len(parts) < 1:
-                continue
+    selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
 
-            offset = 0
-            # If first column is a number, treat it as S NO and skip for vehicle_no
-            try:
-                possible_sno = int(parts[0])
-                serial_no = possible_sno
-                offset = 1
-            except ValueError:
-                offset = 0  # first column is vehicle_no
-
-            vehicle_no = parts[offset] if len(parts) > offset else ""
-            vehicle_type = parts[offset + 1] if len(parts) > offset + 1 else ""
-            owner = parts[offset + 2] if len(parts) > offset + 2 else ""
-            remarks = parts[offset + 3] if len(parts) > offset + 3 else ""
-            idle_date = parts[offset + 4] if len(parts) > offset + 4 else ""
-
-            entry = ReasonEntry(
-                date=selected_date,
-                location=location,
-                serial_no=serial_no,
-                vehicle_no=vehicle_no,
-                vehicle_type=vehicle_type,
-                owner=owner,
-                remarks=remarks,
-                idle_date=idle_date
-            )
-            db.session.add(entry)
-            serial_no += 1
+    if not upload or not upload.filename:
+        abort(400, description="No file uploaded")
 
-    db.session.commit()
+    extension = os.path.splitext(upload.filename)[1].lower()
+    if extension == ".xlsx":
+        chunks = read_xlsx_chunks(upload.stream)
+    elif extension == ".csv":
+        chunks = read_delimited_chunks(upload.stream, sep=",")
+    elif extension in (".tsv", ".txt"):
+        chunks = read_delimited_chunks(upload.stream)
+    else:
+        abort(400, description="Upload an .xlsx, .csv or .tsv file")
 
-    return redirect(url_for("index",
-                            date=selected_date.strftime("%Y-%m-%d"),
-                            location=location))
+    try:
+        report = ingest_reasons(chunks, selected_date, location, _reason_save_mode())
+    except UnreadableUpload as exc:
+        db.session.rollback()
+        abort(400, description=str(exc))
+    return _finish_reason_ingest(report, selected_date, location)
 
 
-@app.route("/download", methods=["GET"])
-def download_report():
-    date_str = request.args.get("date")
-    location = request.args.get("location", "all")
+def _reason_save_mode():
+    return "replace" if request.form.get("mode") == "replace" else "reconcile"
 
-    if not date_str:
-        selected_date = date.today()
-    else:
-        selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
 
-    query = (
-        db.session.query(
-            DailyStatus.date,
-            Vehicle.location,
-            Vehicle.vehicle_type,
-            Vehicle.total_count,
-            DailyStatus.running,
-            DailyStatus.idle
-        )
-        .join(Vehicle, DailyStatus.vehicle_id == Vehicle.id)
-        .filter(DailyStatus.date == selected_date)
+def _finish_reason_ingest(report, selected_date, location):
+    # Reasons do not change the counts, but make sure the day shows up in trends
+    refresh_daily_rollup(selected_date, location=location)
+    bump_data_versions(day_version_key(selected_date))
+    db.session.commit()
+    response_cache.invalidate_date(selected_date)
+    logger.info("Reasons for %s %s (%s): %d inserted, %d updated, %d deleted, %d unchanged, %d rejected",
+                location, selected_date, report["mode"], report["inserted"], report["updated"],
+                report["deleted"], report["unchanged"], report["rejected"])
+
+    # Always shown, so a clean import still tells the user what it changed
+    return render_template(
+        "ingest_report.html",
+        selected_date=selected_date.strftime("%Y-%m-%d"),
+        location=location,
+        report=report
     )
 
-    if location != "all":
-        query = query.filter(Vehicle.location == location)
 
-    query = query.order_by(Vehicle.location, Vehicle.vehicle_type)
-    rows = query.all()
+def _report_args(args):
+    location = args.get("location", "all")
 
-    if not rows:
-        df_status = pd.DataFrame(columns=[
-            "Date", "Location", "Vehicle Type", "Total Count",
-            "Running", "Idle"
-        ])
+    # A range (?from=...&to=...) or a single day (?date=..., default today)
+    date_str = args.get("date")
+    if not date_str:
+        single_date = date.today()
     else:
-        df_status = pd.DataFrame(rows, columns=[
-            "Date", "Location", "Vehicle Type", "Total Count",
-            "Running", "Idle"
-        ])
-
-    # Optional: if you really want blanks instead of 0, uncomment:
-    # for col in ["Total Count", "Running", "Idle"]:
-    #     df_status[col] = df_status[col].replace(0, "")
+        single_date = datetime.strptime(date_str, "%Y-%m-%d").date()
 
-    reason_query = ReasonEntry.query.filter(ReasonEntry.date == selected_date)
-    if location != "all":
-        reason_query = reason_query.filter(ReasonEntry.location == location)
+    from_str = args.get("from")
+    to_str = args.get("to")
+    start_date = datetime.strptime(from_str, "%Y-%m-%d").date() if from_str else single_date
+    end_date = datetime.strptime(to_str, "%Y-%m-%d").date() if to_str else start_date
+    if end_date < start_date:
+        abort(400, description="'to' date must not be before 'from' date")
+    return start_date, end_date, location
 
-    reason_query = reason_query.order_by(ReasonEntry.location, ReasonEntry.serial_no)
-    reason_rows = reason_query.all()
 
-    if not reason_rows:
-        df_reasons = pd.DataFrame(columns=[
-            "Date", "Location", "S No", "VECHILE NO", "VECHILE TYPE",
-            "OWNER", "REMARKS / REASON", "IDLE DATE"
-        ])
-    else:
-        data = []
-        for r in reason_rows:
-            data.append([
-                r.date,
-                r.location,
-                r.serial_no,
-                r.vehicle_no,
-                r.vehicle_type,
-                r.owner,
-                r.remarks,
-                r.idle_date
-            ])
-        df_reasons = pd.DataFrame(data, columns=[
-            "Date", "Location", "S No", "VECHILE NO", "VECHILE TYPE",
-            "OWNER", "REMARKS / REASON", "IDLE DATE"
-        ])
+@app.route("/download", methods=["GET"])
+def download_report():
+    start_date, end_date, location = _report_args(request.args)
+    filename = report_filename(start_date, end_date, location)
+    key = report_key(start_date, end_date, location)
+
+    report = report_store.open_report(key)
+    if report is None:
+        if (end_date - start_date).days + 1 > REPORT_INLINE_MAX_DAYS:
+            # Too long to build inside the request: queue it and let the page poll
+            job = report_jobs.submit(key, start_date, end_date, location)
+            report = report_store.open_report(key) if job["status"] == "done" else None
+            if report is None:
+                return render_template("report_wait.html", job_id=key, filename=filename), 202
+        else:
+            report = report_jobs.build(key, report_meta(start_date, end_date, location),
+                                       start_date, end_date, location)
 
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df_status.to_excel(writer, index=False, sheet_name="Status")
-        df_reasons.to_excel(writer, index=False, sheet_name="Reasons")
+    return send_file(
+        report,
+        as_attachment=True,
+        download_name=filename,
+        mimetype=XLSX_MIMETYPE
+    )
 
-    output.seek(0)
 
+@app.route("/export/<any(status, reasons):dataset>.<any(parquet, csv):fmt>", methods=["GET"])
+def export_data(dataset, fmt):
+    start_date, end_date, location = _report_args(request.args)
+    period = f"{start_date}" if start_date == end_date else f"{start_date}_to_{end_date}"
+    filename = f"{dataset}_{period}.{fmt}"
     if location != "all":
-        safe_loc = str(location).replace(" ", "_")
-        filename = f"vehicle_report_{safe_loc}_{selected_date}.xlsx"
-    else:
-        filename = f"vehicle_report_{selected_date}.xlsx"
-
+        # The location is raw query text: quotes or CR/LF must not reach the header
+        safe_loc = re.sub(r"[^A-Za-z0-9.-]+", "_", str(location)).strip("_") or "location"
+        filename = f"{dataset}_{safe_loc}_{period}.{fmt}"
+
+    if fmt == "csv":
+        rows = iter_csv_export(dataset, start_date, end_date, location)
+        response = app.response_class(stream_with_context(rows), mimetype="text/csv")
+        response.headers.set("Content-Disposition", "attachment", filename=filename)
+        return response
+
+    output = tempfile.TemporaryFile(suffix=".parquet")
+    write_parquet_export(dataset, start_date, end_date, location, output)
+    output.seek(0)
     return send_file(
         output,
         as_attachment=True,
         download_name=filename,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        mimetype="application/vnd.apache.parquet"
+    )
+
+
+def _job_json(job):
+    body = {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "start_date": job.get("start_date"),
+        "end_date": job.get("end_date"),
+        "location": job.get("location"),
+        "filename": job.get("filename"),
+        "status_url": url_for("report_status", job_id=job["job_id"]),
+    }
+    if job["status"] == "done":
+        body["download_url"] = url_for("download_report_job", job_id=job["job_id"])
+    if job.get("error"):
+        body["error"] = job["error"]
+    if "seconds" in job:
+        body["seconds"] = job["seconds"]
+    return body
+
+
+def _check_job_id(job_id):
+    if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+        abort(404)
+
+
+@app.route("/reports", methods=["POST"])
+def submit_report():
+    start_date, end_date, location = _report_args(request.values)
+    key = report_key(start_date, end_date, location)
+    job = report_jobs.submit(key, start_date, end_date, location)
+    return jsonify(_job_json(job)), 200 if job["status"] == "done" else 202
+
+
+@app.route("/reports/<job_id>", methods=["GET"])
+def report_status(job_id):
+    _check_job_id(job_id)
+    job = report_jobs.status(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(_job_json(job))
+
+
+@app.route("/reports/<job_id>/download", methods=["GET"])
+def download_report_job(job_id):
+    _check_job_id(job_id)
+    report = report_store.open_report(job_id)
+    if report is None:
+        abort(404)
+    meta = report_store.read_meta(job_id) or {}
+    return send_file(
+        report,
+        as_attachment=True,
+        download_name=meta.get("filename", f"vehicle_report_{job_id}.xlsx"),
+        mimetype=XLSX_MIMETYPE
     )
 
 
@@ -942,160 +4644,222 @@ def dashboard():
 
     selected_location = request.args.get("location", "all")
 
-    loc_rows = db.session.query(Vehicle.location).distinct().order_by(Vehicle.location).all()
-    locations = [r[0] for r in loc_rows]
+    locations = vehicle_catalog.snapshot().locations
 
-    vehicles_all = Vehicle.query.order_by(Vehicle.location, Vehicle.vehicle_type).all()
+    # Summaries and charts are fetched by the page from /api/dashboard
+    return render_template(
+        "dashboard.html",
+        selected_date=selected_date.strftime("%Y-%m-%d"),
+        selected_location=selected_location,
+        locations=locations
+    )
 
-    statuses = DailyStatus.query.filter_by(date=selected_date).all()
-    status_by_vehicle = {s.vehicle_id: s for s in statuses}
 
-    # --- SUMMARY BY LOCATION ---
-    location_names = locations if selected_location == "all" else [selected_location]
+# --- JSON DATA API ---
 
-    location_summary = []
-    total_fixed_all = total_running_all = total_idle_all = total_notupd_all = 0
+def _api_args():
+    date_str = request.args.get("date")
+    if date_str:
+        selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+    else:
+        selected_date = date.today()
+    return selected_date, request.args.get("location", "all")
 
-    for loc in location_names:
-        v_loc = [v for v in vehicles_all if v.location == loc]
 
-        total_fixed = sum(v.total_count for v in v_loc)
-        total_running = 0
-        total_idle = 0
+def _conditional_json(view, selected_date, selected_location, build):
+    """
+    Answer 304 when If-None-Match matches the current data version, before
+    any summary query runs; otherwise serialize build() with that ETag.
+    """
+    etag = data_etag(view, selected_date, selected_location)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@app.route("/api/dashboard", methods=["GET"])
+def api_dashboard():
+    selected_date, selected_location = _api_args()
+
+    def build():
+        summary = fleet_summary(selected_date, selected_location)
+        location_summary = summary["location_summary"]
+        type_summary = summary["type_summary"]
+        overall_totals = summary["overall_totals"] or {}
+        return {
+            "date": selected_date.strftime("%Y-%m-%d"),
+            "location": selected_location,
+            **summary,
+            "charts": {
+                "location": {
+                    "labels": [row["location"] for row in location_summary],
+                    "running": [row["running"] for row in location_summary],
+                    "idle": [row["idle"] for row in location_summary],
+                    "not_updated": [row["not_updated"] for row in location_summary],
+                },
+                "type": {
+                    "labels": [row["vehicle_type"] for row in type_summary],
+                    "running": [row["running"] for row in type_summary],
+                    "idle": [row["idle"] for row in type_summary],
+                    "not_updated": [row["not_updated"] for row in type_summary],
+                },
+                "overall": {
+                    "running": overall_totals.get("running", 0),
+                    "idle": overall_totals.get("idle", 0),
+                    "not_updated": overall_totals.get("not_updated", 0),
+                },
+            },
+        }
 
-        for v in v_loc:
-            s = status_by_vehicle.get(v.id)
-            if s:
-                total_running += (s.running or 0)
-                total_idle += (s.idle or 0)
+    return _conditional_json("dashboard", selected_date, selected_location, build)
 
-        not_updated = total_fixed - (total_running + total_idle)
-        if not_updated < 0:
-            not_updated = 0
 
-        location_summary.append({
-            "location": loc,
-            "total_fixed": total_fixed,
-            "running": total_running,
-            "idle": total_idle,
-            "not_updated": not_updated
-        })
+@app.route("/api/entries", methods=["GET"])
+def api_entries():
+    selected_date, selected_location = _api_args()
 
-        total_fixed_all += total_fixed
-        total_running_all += total_running
-        total_idle_all += total_idle
-        total_notupd_all += not_updated
-
-    location_summary_totals = None
-    if location_summary:
-        location_summary_totals = type("Obj", (), {
-            "total_fixed": total_fixed_all,
-            "running": total_running_all,
-            "idle": total_idle_all,
-            "not_updated": total_notupd_all
-        })
+    def build():
+        query = (
+            db.session.query(
+                Vehicle.id, Vehicle.location, Vehicle.vehicle_type, Vehicle.total_count,
+                DailyStatus.running, DailyStatus.idle
+            )
+            .outerjoin(
+                DailyStatus,
+                and_(DailyStatus.vehicle_id == Vehicle.id, DailyStatus.date == selected_date),
+            )
+        )
+        if selected_location != "all":
+            query = query.filter(Vehicle.location == selected_location)
+        rows = query.order_by(Vehicle.location, Vehicle.vehicle_type).all()
+
+        reasons = []
+        if selected_location != "all":
+            reasons = (
+                db.session.query(
+                    ReasonEntry.serial_no, ReasonEntry.vehicle_no, ReasonEntry.vehicle_type,
+                    ReasonEntry.owner, ReasonEntry.remarks, ReasonEntry.idle_date
+                )
+                .filter_by(date=selected_date, location=selected_location)
+                .order_by(ReasonEntry.serial_no)
+                .all()
+            )
 
-    # --- SUMMARY BY VEHICLE TYPE ---
-    if selected_location == "all":
-        v_filtered = vehicles_all
-    else:
-        v_filtered = [v for v in vehicles_all if v.location == selected_location]
-
-    type_dict = {}
-    for v in v_filtered:
-        key = v.vehicle_type
-        if key not in type_dict:
-            type_dict[key] = {"total_fixed": 0, "running": 0, "idle": 0}
-
-        type_dict[key]["total_fixed"] += v.total_count
-        s = status_by_vehicle.get(v.id)
-        if s:
-            type_dict[key]["running"] += (s.running or 0)
-            type_dict[key]["idle"] += (s.idle or 0)
-
-    type_summary = []
-    total_fixed_type_all = total_running_type_all = total_idle_type_all = total_notupd_type_all = 0
-
-    for vehicle_type, vals in sorted(type_dict.items()):
-        total_fixed = vals["total_fixed"]
-        total_running = vals["running"]
-        total_idle = vals["idle"]
-        not_updated = total_fixed - (total_running + total_idle)
-        if not_updated < 0:
-            not_updated = 0
-
-        type_summary.append({
-            "vehicle_type": vehicle_type,
-            "total_fixed": total_fixed,
-            "running": total_running,
-            "idle": total_idle,
-            "not_updated": not_updated
-        })
+        return {
+            "date": selected_date.strftime("%Y-%m-%d"),
+            "location": selected_location,
+            "rows": [
+                {
+                    "vehicle_id": vehicle_id,
+                    "location": location,
+                    "vehicle_type": vehicle_type,
+                    "total_count": total_count,
+                    "running": running,
+                    "idle": idle,
+                }
+                for vehicle_id, location, vehicle_type, total_count, running, idle in rows
+            ],
+            "reasons": [dict(r._mapping) for r in reasons],
+        }
 
-        total_fixed_type_all += total_fixed
-        total_running_type_all += total_running
-        total_idle_type_all += total_idle
-        total_notupd_type_all += not_updated
-
-    type_summary_totals = None
-    if type_summary:
-        type_summary_totals = type("Obj", (), {
-            "total_fixed": total_fixed_type_all,
-            "running": total_running_type_all,
-            "idle": total_idle_type_all,
-            "not_updated": total_notupd_type_all
-        })
+    return _conditional_json("entries", selected_date, selected_location, build)
 
-    overall_totals = None
-    if location_summary_totals:
-        overall_totals = type("Obj", (), {
-            "total_fixed": location_summary_totals.total_fixed,
-            "running": location_summary_totals.running,
-            "idle": location_summary_totals.idle,
-            "not_updated": location_summary_totals.not_updated
-        })
 
-    chart_location_labels = [row["location"] for row in location_summary]
-    chart_location_running = [row["running"] for row in location_summary]
-    chart_location_idle = [row["idle"] for row in location_summary]
-    chart_location_not_updated = [row["not_updated"] for row in location_summary]
+@app.route("/api/idle-aging", methods=["GET"])
+def api_idle_aging():
+    selected_date, selected_location = _api_args()
+
+    def build():
+        return {
+            "date": selected_date.strftime("%Y-%m-%d"),
+            "location": selected_location,
+            **idle_aging_summary(selected_date, selected_location),
+            "longest": longest_idle(selected_date, selected_location),
+        }
 
-    chart_type_labels = [row["vehicle_type"] for row in type_summary]
-    chart_type_running = [row["running"] for row in type_summary]
-    chart_type_idle = [row["idle"] for row in type_summary]
-    chart_type_not_updated = [row["not_updated"] for row in type_summary]
+    return _conditional_json("idle-aging", selected_date, selected_location, build)
 
-    chart_overall_running = overall_totals.running if overall_totals else 0
-    chart_overall_idle = overall_totals.idle if overall_totals else 0
-    chart_overall_not_updated = overall_totals.not_updated if overall_totals else 0
 
-    return render_template_string(
-        DASHBOARD_TEMPLATE,
+@app.route("/idle-aging", methods=["GET"])
+def idle_aging():
+    selected_date, selected_location = _api_args()
+    return render_template(
+        "idle_aging.html",
         selected_date=selected_date.strftime("%Y-%m-%d"),
         selected_location=selected_location,
+        locations=vehicle_catalog.snapshot().locations,
+        aging=idle_aging_summary(selected_date, selected_location),
+        longest=longest_idle(selected_date, selected_location)
+    )
+
+
+@app.route("/api/search", methods=["GET"])
+def api_search():
+    return jsonify(search_reasons(request.args.get("q", "").strip(), _search_page()))
+
+
+@app.route("/search", methods=["GET"])
+def search():
+    q = request.args.get("q", "").strip()
+    return render_template("search.html", q=q, results=search_reasons(q, _search_page()))
+
+
+def _search_page():
+    try:
+        return max(int(request.args.get("page", "1")), 1)
+    except ValueError:
+        return 1
+
+
+@app.route("/trends", methods=["GET"])
+def trends():
+    to_str = request.args.get("to")
+    if to_str:
+        end_date = datetime.strptime(to_str, "%Y-%m-%d").date()
+    else:
+        end_date = date.today()
+
+    from_str = request.args.get("from")
+    if from_str:
+        start_date = datetime.strptime(from_str, "%Y-%m-%d").date()
+    else:
+        start_date = end_date - timedelta(days=29)
+
+    selected_location = request.args.get("location", "all")
+    group_by = "type" if request.args.get("group") == "type" else "location"
+    granularity = request.args.get("period", "day")
+    if granularity not in ("day", "week", "month"):
+        granularity = "day"
+
+    locations = vehicle_catalog.snapshot().locations
+
+    trend = trend_summary(start_date, end_date, selected_location, group_by, granularity)
+
+    return render_template(
+        "trends.html",
+        start_date=start_date.strftime("%Y-%m-%d"),
+        end_date=end_date.strftime("%Y-%m-%d"),
+        selected_location=selected_location,
         locations=locations,
-        location_summary=location_summary,
-        location_summary_totals=location_summary_totals,
-        type_summary=type_summary,
-        type_summary_totals=type_summary_totals,
-        overall_totals=overall_totals,
-        chart_location_labels=chart_location_labels,
-        chart_location_running=chart_location_running,
-        chart_location_idle=chart_location_idle,
-        chart_location_not_updated=chart_location_not_updated,
-        chart_type_labels=chart_type_labels,
-        chart_type_running=chart_type_running,
-        chart_type_idle=chart_type_idle,
-        chart_type_not_updated=chart_type_not_updated,
-        chart_overall_running=chart_overall_running,
-        chart_overall_idle=chart_overall_idle,
-        chart_overall_not_updated=chart_overall_not_updated
+        group_by=group_by,
+        granularity=granularity,
+        trend_labels=trend["labels"],
+        trend_series=trend["series"],
+        trend_table=trend["table"]
     )
 
 
 # --- ENTRY POINT ---
 
 if __name__ == "__main__":
+    # Local dev convenience; deployments run `flask --app app init-db`
+    with app.app_context():
+        init_db()
+
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
 
@@ -0,0 +1,236 @@
+# benchmarks/bench_routes.py
+"""
+Route benchmark: latency percentiles, SQL statement counts and peak memory
+for the main routes at several synthetic data sizes.
+
+    python benchmarks/bench_routes.py [--sizes 3x6x30 10x12x180 20x20x365]
+        [--reasons 20] [--iterations 20] [--output results.json]
+        [--compare baseline.json] [--threshold 0.25] [--database-url URL]
+
+A size is LOCATIONSxTYPESxDAYS. Each size runs in its own interpreter
+against a fresh database filled by generate_data.py: a temporary SQLite
+file by default, or --database-url (which is wiped, so use a scratch
+Postgres). Requests go through the Flask test client with the page and
+report caches cleared before each one, so every measurement pays for the
+real work.
+
+Results are written as JSON (default benchmarks/results/routes-<time>.json).
+With --compare, routes whose p50 grew by more than --threshold or whose
+statement count grew at all are reported and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = ["3x6x30", "10x12x180", "20x20x365"]
+
+
+def parse_size(spec):
+    locations, types, days = (int(part) for part in spec.lower().split("x"))
+    return locations, types, days
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# --- CHILD: one data size, one fresh interpreter ---
+
+def route_requests(day, location, vehicles, reasons_per_day, days):
+    """(name, build(i) -> (method, path, form)) for every benchmarked route."""
+    range_start = day - timedelta(days=min(days, 30) - 1)
+
+    def save_form(i):
+        form = {"date": day.isoformat(), "location": "all"}
+        for vehicle_id, total in vehicles:
+            # Alternate values so every save really writes
+            running = (total + i) % (total + 1)
+            form[f"running_{vehicle_id}"] = str(running)
+            form[f"idle_{vehicle_id}"] = str(total - running)
+        return form
+
+    def reasons_form(i):
+        lines = [
+            f"{n}\tTN01AB{n:04d}\tTYPE 01\tOWN\tBREAKDOWN {i % 2}\t{day.strftime('%d-%m-%Y')}"
+            for n in range(1, reasons_per_day + 1)
+        ]
+        return {"date": day.isoformat(), "location": location, "reasons_raw": "\n".join(lines)}
+
+    return [
+        ("GET /", lambda i: ("GET", f"/?date={day}", None)),
+        ("POST /save", lambda i: ("POST", "/save", save_form(i))),
+        ("POST /save_reasons", lambda i: ("POST", "/save_reasons", reasons_form(i))),
+        ("GET /download", lambda i: ("GET", f"/download?date={day}", None)),
+        ("GET /download (30 days)", lambda i: ("GET", f"/download?from={range_start}&to={day}", None)),
+        ("GET /dashboard", lambda i: ("GET", f"/dashboard?date={day}", None)),
+        ("GET /api/dashboard", lambda i: ("GET", f"/api/dashboard?date={day}", None)),
+    ]
+
+
+def run_size(spec, reasons_per_day, iterations, warmup):
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import event
+    from app import app, db, report_store, response_cache, Vehicle
+    from generate_data import generate
+
+    locations, types, days = parse_size(spec)
+    with app.app_context():
+        data = generate(locations, types, days, reasons_per_day, reset=True)
+        engine = db.engine
+        vehicles = db.session.query(Vehicle.id, Vehicle.total_count).order_by(Vehicle.id).all()
+
+    statements = [0]
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.__setitem__(0, statements[0] + 1))
+
+    day = date.fromisoformat(data["end_date"])
+    client = app.test_client()
+
+    def send(build, i):
+        response_cache.clear()
+        report_store.clear()
+        method, path, form = build(i)
+        statements[0] = 0
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=form)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}")
+        return elapsed, statements[0], response.status_code
+
+    routes = {}
+    for name, build in route_requests(day, "LOCATION 01", vehicles, reasons_per_day, days):
+        for i in range(warmup):
+            send(build, i)
+        timings = []
+        counts = set()
+        status = None
+        for i in range(warmup, warmup + iterations):
+            elapsed, count, status = send(build, i)
+            timings.append(elapsed * 1000)
+            counts.add(count)
+
+        tracemalloc.start()
+        send(build, warmup + iterations)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        timings.sort()
+        routes[name] = {
+            "status": status,
+            "p50_ms": round(percentile(timings, 0.50), 3),
+            "p90_ms": round(percentile(timings, 0.90), 3),
+            "p99_ms": round(percentile(timings, 0.99), 3),
+            "mean_ms": round(sum(timings) / len(timings), 3),
+            "queries": max(counts),
+            "peak_kib": round(peak / 1024, 1),
+        }
+
+    return {"size": spec, "dialect": engine.dialect.name, "data": data, "routes": routes}
+
+
+# --- PARENT: orchestrate sizes, write and compare results ---
+
+def run_child(spec, args, scratch):
+    env = dict(os.environ, SLOW_REQUEST_MS="600000", REPORT_CACHE_DIR=os.path.join(scratch, spec + "-reports"))
+    env["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(scratch, spec + '.db')}"
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child", spec,
+        "--reasons", str(args.reasons), "--iterations", str(args.iterations),
+        "--warmup", str(args.warmup),
+    ]
+    proc = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"benchmark for size {spec} failed")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, threshold):
+    previous = {(size["size"], name): route
+                for size in baseline["sizes"] for name, route in size["routes"].items()}
+    regressions = []
+    for size in results["sizes"]:
+        for name, route in size["routes"].items():
+            before = previous.get((size["size"], name))
+            if before is None:
+                continue
+            if route["p50_ms"] > before["p50_ms"] * (1 + threshold):
+                regressions.append(f"{size['size']} {name}: p50 {before['p50_ms']} -> {route['p50_ms']} ms")
+            if route["queries"] > before["queries"]:
+                regressions.append(f"{size['size']} {name}: queries {before['queries']} -> {route['queries']}")
+    return regressions
+
+
+def print_size(result):
+    data = result["data"]
+    print(f"\n{result['size']} ({result['dialect']}): {data['vehicles']} vehicles, "
+          f"{data['daily_status_rows']} status rows, {data['reason_entry_rows']} reason rows")
+    print(f"  {'route':<26}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'queries':>9}{'peak KiB':>11}")
+    for name, route in result["routes"].items():
+        print(f"  {name:<26}{route['p50_ms']:>10.2f}{route['p90_ms']:>10.2f}{route['p99_ms']:>10.2f}"
+              f"{route['queries']:>9}{route['peak_kib']:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="LOCATIONSxTYPESxDAYS")
+    parser.add_argument("--reasons", type=int, default=20, help="reason rows per location per day")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--database-url", default=None, help="scratch database to use (it is wiped)")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="earlier results JSON to check against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed p50 growth (0.25 = 25%%)")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_size(args.child, args.reasons, args.iterations, args.warmup)))
+        return
+
+    for spec in args.sizes:
+        parse_size(spec)
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "iterations": args.iterations,
+        "sizes": [],
+    }
+    with tempfile.TemporaryDirectory() as scratch:
+        for spec in args.sizes:
+            result = run_child(spec, args, scratch)
+            results["sizes"].append(result)
+            print_size(result)
+
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", time.strftime("routes-%Y%m%d-%H%M%S.json")
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as fh:
+        json.dump(results, fh, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(results, json.load(fh), args.threshold)
+        if regressions:
+            print("\nRegressions against", args.compare)
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print("\nNo regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_startup.py
+"""
+Startup benchmark: time from a fresh interpreter importing app.py to the
+first response served, as a cold-started dyno would see it.
+
+    python benchmarks/bench_startup.py [--runs 5] [--path /dashboard]
+
+Each run is a separate subprocess so module caches are cold. The schema
+is expected to exist already (`flask --app app init-db`); exits 1 if the
+first response is not a 200.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+response = app.app.test_client().get(sys.argv[1])
+t2 = time.perf_counter()
+heavy = sorted(m for m in ("pandas", "xlsxwriter", "numpy") if m in sys.modules)
+print(json.dumps({"import": t1 - t0, "first_response": t2 - t1,
+                  "total": t2 - t0, "status": response.status_code, "heavy": heavy}))
+"""
+
+
+def run_once(path):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE, path],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/")
+    args = parser.parse_args()
+
+    results = []
+    for _ in range(args.runs):
+        result = run_once(args.path)
+        # Timings for an error page say nothing about startup
+        if result["status"] != 200:
+            print(f"GET {args.path} returned {result['status']}, not 200; "
+                  "is the schema there (flask --app app init-db)?")
+            sys.exit(1)
+        results.append(result)
+    for key in ("import", "first_response", "total"):
+        values = [r[key] * 1000 for r in results]
+        print(f"{key:<15} median {statistics.median(values):8.1f} ms   "
+              f"min {min(values):8.1f} ms   max {max(values):8.1f} ms")
+    print(f"status {results[-1]['status']}, heavy modules loaded: {results[-1]['heavy'] or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_templates.py
+"""
+Micro-benchmark: per-request template cost with render_template_string()
+(parse + compile every call, the old behaviour) versus render_template()
+from the compiled template registry.
+
+    python benchmarks/bench_templates.py [--iterations 200]
+
+Uses whatever database app.py is configured for (local SQLite by default)
+to build a realistic dashboard / entry-page context, then times only the
+render step.
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template, render_template_string  # noqa: E402
+
+from app import (  # noqa: E402
+    app, fleet_summary, Vehicle, DailyStatus, MAIN_TEMPLATE, DASHBOARD_TEMPLATE
+)
+
+
+def dashboard_context(selected_date):
+    # The dashboard page is a shell; its data comes from /api/dashboard
+    summary = fleet_summary(selected_date)
+    return dict(
+        selected_date=selected_date.strftime("%Y-%m-%d"),
+        selected_location="all",
+        locations=[row["location"] for row in summary["location_summary"]]
+    )
+
+
+def main_context(selected_date):
+    vehicles = Vehicle.query.order_by(Vehicle.location, Vehicle.vehicle_type).all()
+    statuses = {s.vehicle_id: s for s in DailyStatus.query.filter_by(date=selected_date).all()}
+    return dict(
+        selected_date=selected_date.strftime("%Y-%m-%d"),
+        rows=[{"vehicle": v, "status": statuses.get(v.id)} for v in vehicles],
+        locations=sorted({v.location for v in vehicles}),
+        selected_location="all",
+        reasons=[]
+    )
+
+
+def bench(label, fn, iterations):
+    fn()  # warm-up (first compile for the registry case)
+    per_call = timeit.timeit(fn, number=iterations) / iterations
+    print(f"{label:<40} {per_call * 1000:8.3f} ms/render")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--date", default=None, help="YYYY-MM-DD (default: today)")
+    args = parser.parse_args()
+
+    selected_date = date.fromisoformat(args.date) if args.date else date.today()
+
+    with app.test_request_context():
+        cases = [
+            ("main", MAIN_TEMPLATE, "main.html", main_context(selected_date)),
+            ("dashboard", DASHBOARD_TEMPLATE, "dashboard.html", dashboard_context(selected_date)),
+        ]
+        for name, source, registered, context in cases:
+            before = bench(f"{name}: render_template_string", lambda: render_template_string(source, **context), args.iterations)
+            after = bench(f"{name}: compiled registry", lambda: render_template(registered, **context), args.iterations)
+            print(f"{name}: {before / after:.1f}x faster\n")
+
+
+if __name__ == "__main__":
+    main()
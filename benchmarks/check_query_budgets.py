@@ -0,0 +1,158 @@
+# benchmarks/check_query_budgets.py
+"""
+Query-count guard: every endpoint must stay within its SQL statement
+budget, and its count must not grow with the size of the fleet.
+
+    python benchmarks/check_query_budgets.py [--sizes 2x3x7 12x15x7]
+        [--database-url URL]
+
+Each size (LOCATIONSxTYPESxDAYS) is generated into a scratch database (a
+temporary SQLite file unless --database-url, which is wiped) and every
+endpoint in QUERY_BUDGETS is requested once through the test client under
+app.query_budget(). Exits 1 when a budget is exceeded or a count differs
+between sizes, printing the offending statements. Run it before merging
+anything that touches a route or a query.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_SIZES = ["2x3x7", "12x15x7"]
+
+# Statements per request with the page cache cold and the vehicle catalog
+# loaded. Every request pays one data-version lookup; writes add the upsert,
+# rollup refresh and version bump, and /save also edits a vehicle total.
+# Reason saves check the catalog to resolve location / vehicle type keys.
+QUERY_BUDGETS = {
+    "GET /": 2,
+    "POST /save": 5,
+    "POST /save_reasons": 5,
+    "POST /upload_reasons": 4,
+    "GET /download": 3,
+    "POST /reports": 1,
+    "GET /export/status.csv": 1,
+    "GET /dashboard": 1,
+    "GET /api/dashboard": 3,
+    "GET /api/entries": 3,
+    "GET /trends": 2,
+    "GET /idle-aging": 3,
+    "GET /api/idle-aging": 3,
+    "GET /search": 2,
+    "GET /api/search": 2,
+    "GET /metrics": 0,
+}
+
+
+def endpoint_requests(day, location, vehicles):
+    def save_form():
+        form = {"date": day.isoformat(), "location": "all"}
+        for vehicle_id, total in vehicles:
+            form[f"running_{vehicle_id}"] = str(total)
+            form[f"idle_{vehicle_id}"] = "0"
+        vehicle_id, total = vehicles[0]
+        form[f"total_{vehicle_id}"] = str(total + 1)
+        return form
+
+    reasons = "\n".join(
+        f"{n}\tTN01AB{n:04d}\tTYPE 01\tOWN\tBREAKDOWN\t{day.strftime('%d-%m-%Y')}" for n in range(1, 11)
+    )
+
+    def upload_form():
+        return {"date": day.isoformat(), "location": location,
+                "reasons_file": (io.BytesIO(reasons.replace("\t", ",").encode()), "reasons.csv")}
+
+    return {
+        "GET /": ("GET", f"/?date={day}", None),
+        "POST /save": ("POST", "/save", save_form),
+        "POST /save_reasons": ("POST", "/save_reasons",
+                               lambda: {"date": day.isoformat(), "location": location, "reasons_raw": reasons}),
+        "POST /upload_reasons": ("POST", "/upload_reasons", upload_form),
+        "GET /download": ("GET", f"/download?date={day}", None),
+        "POST /reports": ("POST", "/reports", lambda: {"from": (day - timedelta(days=6)).isoformat(), "to": day.isoformat()}),
+        "GET /export/status.csv": ("GET", f"/export/status.csv?from={day - timedelta(days=6)}&to={day}", None),
+        "GET /dashboard": ("GET", f"/dashboard?date={day}", None),
+        "GET /api/dashboard": ("GET", f"/api/dashboard?date={day}", None),
+        "GET /api/entries": ("GET", f"/api/entries?date={day}&location={location}", None),
+        "GET /trends": ("GET", f"/trends?to={day}", None),
+        "GET /idle-aging": ("GET", f"/idle-aging?date={day}", None),
+        "GET /api/idle-aging": ("GET", f"/api/idle-aging?date={day}", None),
+        "GET /search": ("GET", "/search?q=tn", None),
+        "GET /api/search": ("GET", "/api/search?q=break", None),
+        "GET /metrics": ("GET", "/metrics", None),
+    }
+
+
+def measure(spec):
+    """Regenerate the database at this size and return {endpoint: (count, error)}."""
+    from app import (
+        app, db, report_store, response_cache, vehicle_catalog, Vehicle, QueryBudgetExceeded, query_budget
+    )
+    from generate_data import generate
+
+    locations, types, days = (int(part) for part in spec.lower().split("x"))
+    with app.app_context():
+        data = generate(locations, types, days, reasons=10, reset=True)
+        vehicles = db.session.query(Vehicle.id, Vehicle.total_count).order_by(Vehicle.id).all()
+    vehicle_catalog.clear()
+
+    client = app.test_client()
+    day = date.fromisoformat(data["end_date"])
+    results = {}
+    for name, (method, path, form) in endpoint_requests(day, "LOCATION 01", vehicles).items():
+        # Cold page and report caches, warm catalog: a busy worker's steady state
+        response_cache.clear()
+        report_store.clear()
+        with app.app_context():
+            vehicle_catalog.snapshot()
+        error = None
+        try:
+            with query_budget(QUERY_BUDGETS[name], name) as counter:
+                response = client.open(path, method=method, data=form() if form else None)
+                response.get_data()
+        except QueryBudgetExceeded as exc:
+            error = str(exc)
+        if response.status_code >= 400:
+            error = f"{name} returned {response.status_code}"
+        results[name] = (counter.count, error)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="LOCATIONSxTYPESxDAYS")
+    parser.add_argument("--database-url", default=None, help="scratch database to use (it is wiped)")
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(scratch.name, 'budget.db')}"
+    os.environ["REPORT_CACHE_DIR"] = os.path.join(scratch.name, "reports")
+    os.environ.setdefault("SLOW_REQUEST_MS", "600000")
+
+    by_size = {spec: measure(spec) for spec in args.sizes}
+
+    failures = []
+    print(f"{'endpoint':<24}{'budget':>8}" + "".join(f"{spec:>12}" for spec in args.sizes))
+    for name, budget in QUERY_BUDGETS.items():
+        counts = [by_size[spec][name][0] for spec in args.sizes]
+        print(f"{name:<24}{budget:>8}" + "".join(f"{count:>12}" for count in counts))
+        failures.extend(by_size[spec][name][1] for spec in args.sizes if by_size[spec][name][1])
+        if len(set(counts)) > 1:
+            failures.append(f"{name} statement count grows with fleet size: {counts}")
+
+    scratch.cleanup()
+    if failures:
+        print("\nQuery budget check failed:")
+        for failure in failures:
+            print("- " + failure)
+        sys.exit(1)
+    print("\nAll endpoints within budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/check_reason_ingest.py
+"""
+Reason ingestion guard: pasted rows must parse the way the paste box
+always has.
+
+    python benchmarks/check_reason_ingest.py
+
+Each case in CASES is pasted text run through read_delimited_chunks() and
+normalize_reason_chunk(), with no database involved. The saved
+(serial_no, vehicle_no, vehicle_type, remarks) tuples and the number of
+rejected rows must match. Exits 1 on any mismatch. Run it before merging
+anything that touches reason parsing.
+"""
+import io
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# name: (pasted text, expected saved rows, expected rejected count)
+CASES = {
+    "numbered rows": (
+        "1\tTN01AB0001\tJCB\tOWN\tBREAKDOWN\t01-10-2026\n"
+        "2\tTN01AB0002\tTIPPER\tHIRE\tNO DRIVER\t02-10-2026",
+        [(1, "TN01AB0001", "JCB", "BREAKDOWN"), (2, "TN01AB0002", "TIPPER", "NO DRIVER")],
+        0,
+    ),
+    "unnumbered rows continue the numbering": (
+        "5\tTN01AB0001\tJCB\tOWN\tBREAKDOWN\t01-10-2026\n"
+        "TN01AB0002\tTIPPER\tHIRE\tNO DRIVER\t02-10-2026",
+        [(5, "TN01AB0001", "JCB", "BREAKDOWN"), (6, "TN01AB0002", "TIPPER", "NO DRIVER")],
+        0,
+    ),
+    "blank S NO cell from Excel": (
+        "\tTN01AB0001\tJCB\tOWN\tBREAKDOWN\t01-10-2026\n"
+        "\tTN01AB0002\tTIPPER\tHIRE\tNO DRIVER\t",
+        [(1, "TN01AB0001", "JCB", "BREAKDOWN"), (2, "TN01AB0002", "TIPPER", "NO DRIVER")],
+        0,
+    ),
+    "a single row without S NO": (
+        "TN01AB0001\tJCB\tOWN\tBREAKDOWN\t01-10-2026",
+        [(1, "TN01AB0001", "JCB", "BREAKDOWN")],
+        0,
+    ),
+    "short and overlong rows": (
+        "1\tTN01AB0001\tJCB\n"
+        "2\tTN01AB0002\tTIPPER\tHIRE\tNO DRIVER\t02-10-2026\tEXTRA\tCELLS",
+        [(1, "TN01AB0001", "JCB", ""), (2, "TN01AB0002", "TIPPER", "NO DRIVER")],
+        0,
+    ),
+    "a cell starting with a quote stays on its line": (
+        "1\tTN01AB0001\tJCB\tOWN\t\"WAITING FOR SPARES\t01-10-2026\n"
+        "2\tTN01AB0002\tTIPPER\tHIRE\tNO DRIVER\n"
+        "3\tTN01AB0003\tJCB\tOWN\t\"BATTERY\" DOWN\t",
+        [(1, "TN01AB0001", "JCB", '"WAITING FOR SPARES'), (2, "TN01AB0002", "TIPPER", "NO DRIVER"),
+         (3, "TN01AB0003", "JCB", '"BATTERY" DOWN')],
+        0,
+    ),
+    "header and blank lines are skipped": (
+        "S NO\tVEHICLE NO\tVEHICLE TYPE\tOWNER\tREMARKS\tIDLE DATE\n"
+        "\n"
+        "1\tTN01AB0001\tJCB\tOWN\tBREAKDOWN\t01-10-2026",
+        [(1, "TN01AB0001", "JCB", "BREAKDOWN")],
+        0,
+    ),
+    "missing vehicle number is rejected": (
+        "1\t\tJCB\tOWN\tBREAKDOWN\t01-10-2026\n"
+        "2\tTN01AB0002\tTIPPER\tHIRE\tNO DRIVER\t",
+        [(2, "TN01AB0002", "TIPPER", "NO DRIVER")],
+        1,
+    ),
+}
+
+
+def run_case(text):
+    from app import normalize_reason_chunk, read_delimited_chunks
+
+    saved, rejected = [], 0
+    row_offset, last_serial = 0, 0
+    for chunk in read_delimited_chunks(io.StringIO(text)):
+        records, issues, last_serial = normalize_reason_chunk(chunk, row_offset, last_serial)
+        row_offset += len(chunk)
+        saved += [(r["serial_no"], r["vehicle_no"], r["vehicle_type"], r["remarks"]) for r in records]
+        rejected += sum(1 for issue in issues if issue["level"] == "error")
+    return saved, rejected
+
+
+def main():
+    failures = []
+    for name, (text, expected, expected_rejected) in CASES.items():
+        saved, rejected = run_case(text)
+        ok = saved == expected and rejected == expected_rejected
+        print(f"{'ok' if ok else 'FAIL':<6}{name}")
+        if not ok:
+            failures.append(f"{name}: saved {saved}, rejected {rejected}; "
+                            f"expected {expected}, rejected {expected_rejected}")
+
+    if failures:
+        print("\nReason ingestion check failed:")
+        for failure in failures:
+            print("- " + failure)
+        sys.exit(1)
+    print("\nAll ingestion cases pass.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# benchmarks/generate_data.py
+"""
+Synthetic fleet data: fill the schema with a configurable fleet and history.
+
+    python benchmarks/generate_data.py [--locations 10] [--types 12]
+        [--days 365] [--reasons 20] [--end-date YYYY-MM-DD] [--seed 1] --reset
+
+Writes to whatever database app.py is configured for (DATABASE_URL, or the
+local SQLite file), e.g. DATABASE_URL=sqlite:////tmp/bench.db. --reset drops
+and recreates every table first, so never point it at production.
+
+Each location gets every vehicle type, each vehicle one DailyStatus row per
+day (about 5% of days are left "not updated") and each location --reasons
+ReasonEntry rows per day. The daily rollup is rebuilt at the end.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect  # noqa: E402
+
+from app import (  # noqa: E402
+    app, db, Vehicle, DailyStatus, ReasonEntry, Location, VehicleType, CATALOG_VERSION_KEY,
+    backfill_daily_rollup, bump_data_versions, dimension_ids, dimension_key, ensure_reason_search_schema,
+    ensure_status_unique_index, normalize_vehicle_no
+)
+
+BATCH_SIZE = 5000
+MISSING_STATUS_RATE = 0.05
+
+OWNERS = ["OWN", "HIRE", "CONTRACT", "LEASE"]
+REMARKS = [
+    "BREAKDOWN", "TYRE PUNCTURE", "ENGINE WORK", "NO DRIVER", "BATTERY DOWN",
+    "WAITING FOR SPARES", "ACCIDENT REPAIR", "FC RENEWAL", "HYDRAULIC LEAK",
+]
+
+
+def location_names(count):
+    return [f"LOCATION {i:02d}" for i in range(1, count + 1)]
+
+
+def vehicle_type_names(count):
+    return [f"TYPE {i:02d}" for i in range(1, count + 1)]
+
+
+def vehicle_number(rng):
+    letters = "ABCDEFGHJKLMNPRSTUVWXYZ"
+    return f"TN{rng.randint(1, 99):02d}{rng.choice(letters)}{rng.choice(letters)}{rng.randint(1, 9999):04d}"
+
+
+def _insert_batches(table, rows):
+    inserted = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        inserted += len(batch)
+    db.session.commit()
+    return inserted
+
+
+def _status_rows(vehicles, days, rng):
+    for day in days:
+        for vehicle_id, total in vehicles:
+            if rng.random() < MISSING_STATUS_RATE:
+                continue
+            running = rng.randint(0, total)
+            yield {
+                "date": day,
+                "vehicle_id": vehicle_id,
+                "running": running,
+                "idle": rng.randint(0, total - running),
+            }
+
+
+def _reason_rows(location_ids, type_ids, days, per_day, rng):
+    types = list(type_ids)
+    for day in days:
+        for location, location_id in location_ids.items():
+            for serial_no in range(1, per_day + 1):
+                idle_since = day - timedelta(days=rng.randint(0, 60))
+                vehicle_no = vehicle_number(rng)
+                vehicle_type = rng.choice(types)
+                yield {
+                    "date": day,
+                    "location": location,
+                    "location_id": location_id,
+                    "serial_no": serial_no,
+                    "vehicle_no": vehicle_no,
+                    "vehicle_no_norm": normalize_vehicle_no(vehicle_no),
+                    "vehicle_type": vehicle_type,
+                    "vehicle_type_id": type_ids[vehicle_type],
+                    "owner": rng.choice(OWNERS),
+                    "remarks": rng.choice(REMARKS),
+                    "idle_date": idle_since.strftime("%d-%m-%Y"),
+                    "idle_since": idle_since,
+                }
+
+
+def generate(locations=10, types=12, days=365, reasons=20, end_date=None, seed=1, reset=False):
+    """
+    Populate the configured database. Must run inside an app context.
+    Returns the row counts and the generated date range.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    day_list = [start_date + timedelta(days=i) for i in range(days)]
+    location_list = location_names(locations)
+    type_list = vehicle_type_names(types)
+
+    if reset:
+        # End the session's transaction first: its locks would block DROP TABLE
+        db.session.close()
+        db.drop_all()
+    db.create_all()
+    ensure_status_unique_index()
+    ensure_reason_search_schema()
+
+    started = time.perf_counter()
+    location_keys = dimension_ids(Location, location_list)
+    type_keys = dimension_ids(VehicleType, type_list)
+    location_ids = {loc: location_keys[dimension_key(loc)] for loc in location_list}
+    type_ids = {vtype: type_keys[dimension_key(vtype)] for vtype in type_list}
+    db.session.execute(Vehicle.__table__.insert(), [
+        {
+            "location": loc, "vehicle_type": vtype, "total_count": rng.randint(0, 40),
+            "location_id": location_ids[loc], "vehicle_type_id": type_ids[vtype],
+        }
+        for loc in location_list for vtype in type_list
+    ])
+    bump_data_versions(CATALOG_VERSION_KEY)
+    db.session.commit()
+    vehicles = db.session.query(Vehicle.id, Vehicle.total_count).order_by(Vehicle.id).all()
+
+    statuses = _insert_batches(DailyStatus.__table__, _status_rows(vehicles, day_list, rng))
+    reason_count = _insert_batches(
+        ReasonEntry.__table__, _reason_rows(location_ids, type_ids, day_list, reasons, rng)
+    )
+    backfill_daily_rollup(start_date, end_date)
+
+    return {
+        "locations": locations,
+        "vehicle_types": types,
+        "days": days,
+        "reasons_per_location_day": reasons,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "vehicles": len(vehicles),
+        "daily_status_rows": statuses,
+        "reason_entry_rows": reason_count,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--locations", type=int, default=10)
+    parser.add_argument("--types", type=int, default=12)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--reasons", type=int, default=20, help="reason rows per location per day")
+    parser.add_argument("--end-date", default=None, help="YYYY-MM-DD (default: today)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate all tables first")
+    args = parser.parse_args()
+
+    with app.app_context():
+        has_vehicles = inspect(db.engine).has_table("vehicle") and db.session.query(Vehicle).first()
+        if not args.reset and has_vehicles:
+            parser.error("database already has vehicles; pass --reset to replace everything")
+        summary = generate(
+            args.locations, args.types, args.days, args.reasons,
+            date.fromisoformat(args.end_date) if args.end_date else None,
+            args.seed, args.reset
+        )
+
+    for key, value in summary.items():
+        print(f"{key:<26} {value}")
+
+
+if __name__ == "__main__":
+    main()
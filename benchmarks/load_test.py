@@ -0,0 +1,119 @@
+# benchmarks/load_test.py
+"""
+Load test: throughput of the gunicorn serving profile at several worker
+counts, to show that requests are served concurrently.
+
+    python benchmarks/load_test.py [--workers 1 2 4] [--threads 4]
+        [--clients 16] [--seconds 10] [--path /api/dashboard]
+
+For each worker count a gunicorn process is started with gunicorn.conf.py
+on a free local port, warmed up, then hit by --clients concurrent
+keep-alive clients for --seconds. Uses the database app.py is configured
+for (DATABASE_URL or the local SQLite file); run `flask --app app init-db`
+first.
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port, path, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", path)
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not answer on port {port}")
+
+
+def client(port, path, stop_at, latencies, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    while time.time() < stop_at:
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+        except ConnectionResetError:
+            # Keep-alive connection closed by a recycled worker (max_requests)
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        except (OSError, http.client.HTTPException) as exc:
+            errors.append(exc)
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def run(workers, threads, clients, seconds, path):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "-c", "gunicorn.conf.py"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(port, path)
+        latencies, errors = [], []
+        stop_at = time.time() + seconds
+        pool = [threading.Thread(target=client, args=(port, path, stop_at, latencies, errors))
+                for _ in range(clients)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    ms = [x * 1000 for x in latencies]
+    return {
+        "workers": workers,
+        "rps": len(latencies) / seconds,
+        "p50": statistics.median(ms) if ms else 0.0,
+        "p95": ms[int(len(ms) * 0.95) - 1] if ms else 0.0,
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--path", default="/api/dashboard")
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+    for workers in args.workers:
+        r = run(workers, args.threads, args.clients, args.seconds, args.path)
+        print(f"{r['workers']:>7} {r['rps']:>9.1f} {r['p50']:>9.1f} {r['p95']:>9.1f} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
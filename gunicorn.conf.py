@@ -0,0 +1,44 @@
+# gunicorn.conf.py
+# Production serving profile. Everything is tunable from the environment:
+#   WEB_CONCURRENCY   worker processes (default 2)
+#   GUNICORN_THREADS  threads per worker (default 4)
+# Each worker keeps its own SQLAlchemy pool (DB_POOL_SIZE + DB_MAX_OVERFLOW,
+# see app.py), so size both together against the database connection limit.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks (e.g. big exports) do not pile up
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = 100
+
+# Importing app.py does no database work (see `flask init-db`), so the app
+# can be loaded once in the master and shared copy-on-write by the workers.
+preload_app = True
+
+# The in-process page cache cannot see other workers' invalidations; with
+# several workers default to the SQLite-backed cache shared on this host.
+if workers > 1:
+    os.environ.setdefault("RESPONSE_CACHE_PATH", "/tmp/vehicle-response-cache.db")
+
+
+def on_starting(server):
+    # The shared cache file outlives the process: drop pages rendered by the
+    # previous release's code and templates before any worker serves one
+    from app import response_cache
+    response_cache.clear()
+
+
+def post_fork(server, worker):
+    # Never share pooled connections inherited from the master across processes
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -1,7 +1,16 @@
 # migrate_sqlite_to_postgres.py
+import argparse
+import hashlib
+import io
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -92,43 +101,294 @@ class ReasonEntryTgt(tgt_db.Model):
     remarks = tgt_db.Column(tgt_db.String(255))
     idle_date = tgt_db.Column(tgt_db.String(50))
 
-def migrate():
+# Copied in foreign-key order; each pair is (source model, target model)
+TABLES = [
+    (VehicleSrc, VehicleTgt),
+    (DailyStatusSrc, DailyStatusTgt),
+    (ReasonEntrySrc, ReasonEntryTgt),
+]
+
+BATCH_SIZE = int(os.getenv("MIGRATE_BATCH_SIZE", "5000"))
+CHECKPOINT_FILE = os.getenv("MIGRATE_CHECKPOINT", "migrate_checkpoint.json")
+USE_COPY = os.getenv("MIGRATE_USE_COPY", "1") != "0"
+
+
+def load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_checkpoint(path, checkpoint):
+    # Write-then-rename so an interrupted run never leaves a truncated file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def read_batches(conn, table, after_id, batch_size):
+    """Keyset-paginate the source table by id; only one batch is in memory."""
+    while True:
+        rows = conn.execute(
+            select(table).where(table.c.id > after_id).order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1].id
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def primary_key_columns(conn, table):
+    """
+    The target's primary key, used as the ON CONFLICT target: (id, date)
+    once app.py has partitioned the table by month, else (id).
+    """
+    return inspect(conn).get_pk_constraint(table.name)["constrained_columns"]
+
+
+def copy_batch(conn, table, rows, key_columns):
+    """
+    COPY a batch into a temp staging table, then move it into the real table
+    with ON CONFLICT DO NOTHING. Rows already present (from an earlier,
+    interrupted run or a partially filled target) are skipped, not errors.
+    """
+    columns = ", ".join(f'"{c.name}"' for c in table.columns)
+    stage = f"_stage_{table.name}"
+    conn.exec_driver_sql(
+        f'CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE "{table.name}" INCLUDING DEFAULTS) '
+        "ON COMMIT DELETE ROWS"
+    )
+
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(_copy_value(v) for v in row) + "\n")
+    buf.seek(0)
+
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {stage} ({columns}) FROM STDIN", buf)
+    finally:
+        cursor.close()
+
+    return conn.exec_driver_sql(
+        f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM {stage} '
+        f"ON CONFLICT ({', '.join(key_columns)}) DO NOTHING"
+    ).rowcount
+
+
+def insert_batch(conn, table, rows, key_columns):
+    """Multi-row INSERT ... ON CONFLICT DO NOTHING fallback when COPY is disabled."""
+    stmt = pg_insert(table).values([dict(row._mapping) for row in rows])
+    return conn.execute(stmt.on_conflict_do_nothing(index_elements=key_columns)).rowcount
+
+
+def reset_sequences(conn):
+    """Point each id sequence past the copied ids so new rows do not collide."""
+    for _, tgt_model in TABLES:
+        name = tgt_model.__tablename__
+        conn.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+            f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM \"{name}\""
+        )
+        logger.info("Sequence reset for %s", name)
+
+
+def backfill_derived_data():
+    """
+    Fill what app.py derives from the copied columns: location / vehicle
+    type keys, vehicle_no_norm, idle_since and the daily rollup. The copy
+    carries only the original columns, and without these migrated vehicles
+    drop out of the dashboard and reasons out of search and idle aging.
+    Runs app.py's own schema upgrade and backfills against the target.
+    """
+    os.environ["DATABASE_URL"] = TARGET_DB_URL
+    from app import (
+        app, db, DailyStatus, backfill_daily_rollup, backfill_dimension_keys, backfill_idle_since,
+        backfill_vehicle_numbers, init_db
+    )
+    from sqlalchemy import func
+
+    with app.app_context():
+        init_db()
+        logger.info("Resolved dimension keys for %d rows", backfill_dimension_keys())
+        logger.info("Normalized %d vehicle numbers", backfill_vehicle_numbers())
+        logger.info("Parsed %d of %d idle dates", *backfill_idle_since())
+        first, last = db.session.query(func.min(DailyStatus.date), func.max(DailyStatus.date)).one()
+        if first is not None:
+            backfill_daily_rollup(first, last)
+
+
+def get_engines():
+    # Engines outlive the app contexts they are looked up in
+    with src_app.app_context():
+        src_engine = src_db.engine
+    with tgt_app.app_context():
+        tgt_engine = tgt_db.engine
+    return src_engine, tgt_engine
+
+
+def copy_table(src_engine, tgt_engine, src_model, tgt_model, batch_size, checkpoint, checkpoint_path, lock):
+    """Copy one table batch by batch, checkpointing after every commit."""
+    name = tgt_model.__tablename__
+    write_batch = copy_batch if USE_COPY else insert_batch
+    with lock:
+        last_id = checkpoint.get(name, 0)
+    copied = skipped = 0
+    with tgt_engine.connect() as tgt_conn:
+        key_columns = primary_key_columns(tgt_conn, tgt_model.__table__)
+
+    with src_engine.connect() as src_conn:
+        for rows in read_batches(src_conn, src_model.__table__, last_id, batch_size):
+            with tgt_engine.begin() as tgt_conn:
+                inserted = write_batch(tgt_conn, tgt_model.__table__, rows, key_columns)
+            copied += inserted
+            skipped += len(rows) - inserted
+
+            with lock:
+                checkpoint[name] = rows[-1].id
+                save_checkpoint(checkpoint_path, checkpoint)
+            logger.info("%s: copied up to id %s (%d copied, %d already present)",
+                        name, rows[-1].id, copied, skipped)
+
+    logger.info("%s migrated: %d rows copied, %d skipped", name, copied, skipped)
+    return copied
+
+
+def migrate(batch_size=BATCH_SIZE, checkpoint_path=CHECKPOINT_FILE, restart=False, workers=1):
+    """
+    Stream every table from SQLite to Postgres in fixed-size batches.
+
+    The source is read with keyset pagination (id > last_id), each batch is
+    written with COPY (or a multi-row INSERT) and committed, and the last
+    copied id per table is saved to `checkpoint_path`. Re-running after an
+    interruption resumes from the checkpoint.
+
+    With workers > 1 tables are copied concurrently: reason_entry has no
+    foreign keys and runs alongside vehicle; daily_status starts once
+    vehicle has finished, since it references vehicle ids.
+    """
     with tgt_app.app_context():
         tgt_db.create_all()
         logger.info("Created tables in target if needed.")
 
-    with src_app.app_context():
-        src_vehicles = src_db.session.query(VehicleSrc).all()
-        src_statuses = src_db.session.query(DailyStatusSrc).all()
-        src_reasons = src_db.session.query(ReasonEntrySrc).all()
+    checkpoint = {} if restart else load_checkpoint(checkpoint_path)
+    if checkpoint:
+        logger.info("Resuming from checkpoint %s: %s", checkpoint_path, checkpoint)
+
+    src_engine, tgt_engine = get_engines()
+    lock = threading.Lock()
+
+    def run(pair):
+        return copy_table(src_engine, tgt_engine, *pair, batch_size, checkpoint, checkpoint_path, lock)
+
+    if workers <= 1:
+        for pair in TABLES:
+            run(pair)
+    else:
+        vehicles, statuses, reasons = TABLES
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            vehicle_job = pool.submit(run, vehicles)
+            reason_job = pool.submit(run, reasons)
+            vehicle_job.result()
+            status_job = pool.submit(run, statuses)
+            for job in (reason_job, status_job):
+                job.result()
+
+    with tgt_engine.begin() as tgt_conn:
+        reset_sequences(tgt_conn)
+    backfill_derived_data()
+
+    logger.info("Migration complete.")
+
+
+# --- VERIFICATION ---
+
+VERIFY_CHUNK_SIZE = 10000  # ids per checksum chunk; keeps 48-bit hash sums inside int64
+
+
+def _row_text(table):
+    """SQL expression rendering a row as text identically on SQLite and Postgres."""
+    parts = [f"COALESCE(CAST(\"{c.name}\" AS TEXT), '\\N')" for c in table.columns]
+    return " || '|' || ".join(parts)
+
+
+def _sqlite_hash48(value):
+    return int(hashlib.md5(value.encode("utf-8")).hexdigest()[:12], 16)
+
+
+def chunk_checksums(engine, table, chunk_size=VERIFY_CHUNK_SIZE):
+    """
+    {chunk: (row_count, hash_sum)} computed inside the database.
+
+    Each row is hashed (first 48 bits of md5 of its text form) and the hashes
+    are summed per id chunk, so the result is order-independent and only one
+    small tuple per chunk travels back to Python.
+    """
+    if engine.dialect.name == "postgresql":
+        row_hash = f"('x' || substr(md5({_row_text(table)}), 1, 12))::bit(48)::bigint"
+    else:
+        row_hash = f"hash48({_row_text(table)})"
+
+    sql = (
+        f"SELECT id / {int(chunk_size)} AS chunk, COUNT(*), SUM({row_hash}) "
+        f"FROM \"{table.name}\" GROUP BY id / {int(chunk_size)}"
+    )
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.connection.driver_connection.create_function("hash48", 1, _sqlite_hash48, deterministic=True)
+        return {chunk: (count, int(total)) for chunk, count, total in conn.exec_driver_sql(sql)}
+
+
+def verify(chunk_size=VERIFY_CHUNK_SIZE):
+    """Compare row counts and per-chunk checksums of every table. Returns True if all match."""
+    src_engine, tgt_engine = get_engines()
+    all_ok = True
+
+    for src_model, tgt_model in TABLES:
+        name = tgt_model.__tablename__
+        # Source and target sides are computed in parallel; both are single queries
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            src_job = pool.submit(chunk_checksums, src_engine, src_model.__table__, chunk_size)
+            tgt_job = pool.submit(chunk_checksums, tgt_engine, tgt_model.__table__, chunk_size)
+            src_sums, tgt_sums = src_job.result(), tgt_job.result()
+
+        src_rows = sum(count for count, _ in src_sums.values())
+        tgt_rows = sum(count for count, _ in tgt_sums.values())
+        bad_chunks = sorted(c for c in set(src_sums) | set(tgt_sums) if src_sums.get(c) != tgt_sums.get(c))
+
+        if bad_chunks:
+            all_ok = False
+            ranges = ", ".join(f"{c * chunk_size}-{(c + 1) * chunk_size - 1}" for c in bad_chunks[:20])
+            logger.error("%s: MISMATCH source %d rows, target %d rows; differing id ranges: %s",
+                         name, src_rows, tgt_rows, ranges)
+        else:
+            logger.info("%s: OK (%d rows, %d chunks match)", name, src_rows, len(src_sums))
+
+    return all_ok
 
-    with tgt_app.app_context():
-        existing_vehicle_ids = {v.id for v in tgt_db.session.query(VehicleTgt).all()}
-        for v in src_vehicles:
-            if v.id in existing_vehicle_ids:
-                logger.info("Vehicle %s exists in target — skipping", v.id)
-                continue
-            tgt_db.session.add(VehicleTgt(id=v.id, vehicle_type=v.vehicle_type, location=v.location, total_count=v.total_count))
-        tgt_db.session.commit()
-        logger.info("Vehicles migrated: %d", len(src_vehicles))
-
-        existing_status_ids = {s.id for s in tgt_db.session.query(DailyStatusTgt).all()}
-        for s in src_statuses:
-            if s.id in existing_status_ids:
-                continue
-            tgt_db.session.add(DailyStatusTgt(id=s.id, date=s.date, vehicle_id=s.vehicle_id, running=s.running, idle=s.idle, idle_from=s.idle_from, reason=s.reason))
-        tgt_db.session.commit()
-        logger.info("DailyStatus migrated: %d", len(src_statuses))
-
-        existing_reason_ids = {r.id for r in tgt_db.session.query(ReasonEntryTgt).all()}
-        for r in src_reasons:
-            if r.id in existing_reason_ids:
-                continue
-            tgt_db.session.add(ReasonEntryTgt(id=r.id, date=r.date, location=r.location, serial_no=r.serial_no, vehicle_no=r.vehicle_no, vehicle_type=r.vehicle_type, owner=r.owner, remarks=r.remarks, idle_date=r.idle_date))
-        tgt_db.session.commit()
-        logger.info("ReasonEntry migrated: %d", len(src_reasons))
-
-    logger.info("Migration complete. Verify Postgres UI for data.")
 
 if __name__ == "__main__":
-    migrate()
+    parser = argparse.ArgumentParser(description="Copy vehicles.db (SQLite) into Postgres.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint.")
+    parser.add_argument("--workers", type=int, default=1, help="Copy tables concurrently (FK order kept).")
+    parser.add_argument("--verify", action="store_true", help="Compare checksums after copying.")
+    parser.add_argument("--verify-only", action="store_true", help="Skip the copy; only compare.")
+    args = parser.parse_args()
+
+    if not args.verify_only:
+        migrate(args.batch_size, args.checkpoint, args.restart, args.workers)
+    if args.verify or args.verify_only:
+        raise SystemExit(0 if verify() else 1)